@@ -6,6 +6,7 @@ import logging
 
 from config.settings import SettingsReloader, get_settings, resolve_env_file
 from core.bili_client import setup_request_client
+from core.http import close_shared_session
 from db.sqlite import init_db
 from services.collector_service import CollectorService
 from services.bot_service import build_pipeline
@@ -60,7 +61,10 @@ async def main() -> None:
     if announcement_task:
         tasks.append(announcement_task)
 
-    await asyncio.gather(*tasks)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await close_shared_session()
 
 if __name__ == "__main__":
     asyncio.run(main())
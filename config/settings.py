@@ -75,6 +75,7 @@ class Settings:
 
     thank_global_cooldown_sec: int
     thank_per_user_cooldown_sec: int
+    thank_burst: int
     thank_per_user_daily_limit: int
     thank_mode: str
     thank_value_threshold: int
@@ -247,6 +248,7 @@ def get_settings(env_file: str | None = None) -> Settings:
 
         thank_global_cooldown_sec=int(_get_env("THANK_GLOBAL_COOLDOWN_SEC", "10", env)),
         thank_per_user_cooldown_sec=int(_get_env("THANK_PER_USER_COOLDOWN_SEC", "60", env)),
+        thank_burst=max(int(_get_env("THANK_BURST", "1", env)), 1),
         thank_per_user_daily_limit=thank_per_user_daily_limit,
         thank_mode=thank_mode,
         thank_value_threshold=thank_value_threshold,
@@ -285,15 +287,16 @@ class SettingsReloader:
 
     def __init__(self, env_file: str | None = None):
         self.env_file = resolve_env_file(env_file)
+        self._path = Path(self.env_file) if self.env_file else None
         self._cached = get_settings(self.env_file)
         self._last_mtime = self._get_mtime()
 
-    def _get_mtime(self) -> Optional[float]:
-        if not self.env_file:
+    def _get_mtime(self) -> Optional[int]:
+        # 每个事件都会调用，复用 Path 并用整数纳秒时间戳比较。
+        if self._path is None:
             return None
-        path = Path(self.env_file)
         try:
-            return path.stat().st_mtime
+            return self._path.stat().st_mtime_ns
         except FileNotFoundError:
             return None
 
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+# 无第三方依赖，urllib 回退路径（aiohttp 不可用时）也能直接引用。
+
+# B 站接口如果没有常见浏览器 UA 会返回 412，补充请求头提升成功率。
+BROWSER_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/127.0.0.0 Safari/537.36"
+)
+
+BILI_HEADERS = {
+    "User-Agent": BROWSER_USER_AGENT,
+    "Referer": "https://live.bilibili.com/",
+}
+
+ROOM_INIT_URL = "https://api.live.bilibili.com/room/v1/Room/room_init?id={room_id}"
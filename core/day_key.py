@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class DayKeyCache:
+    """Map timestamps to local ``YYYY-MM-DD`` keys, recomputing only across midnight."""
+
+    _day: str = field(default="", init=False)
+    _start: float = field(default=0.0, init=False)
+    _end: float = field(default=0.0, init=False)
+
+    def day_key(self, ts: float) -> str:
+        if self._start <= ts < self._end:
+            return self._day
+
+        lt = time.localtime(ts)
+        self._day = f"{lt.tm_year:04d}-{lt.tm_mon:02d}-{lt.tm_mday:02d}"
+        # mktime 处理月末进位和夏令时，边界总是本地时间的零点。
+        self._start = time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday, 0, 0, 0, 0, 0, -1))
+        self._end = time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+        return self._day
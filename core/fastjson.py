@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:  # pragma: no cover - orjson 为可选加速依赖
+    import orjson
+except ImportError:  # 未安装时退回标准库
+    orjson = None
+
+# orjson.JSONDecodeError 继承自 json.JSONDecodeError，调用方统一捕获后者即可。
+JSONDecodeError = json.JSONDecodeError
+
+
+def loads(data: bytes | str) -> Any:
+    """Parse JSON from bytes or str; orjson reads bytes without a UTF-8 decode step."""
+
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """Serialize to a str, keeping non-ASCII text and accepting int dict keys."""
+
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Serialize straight to UTF-8 bytes for HTTP bodies; orjson skips the str round trip."""
+
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -2,8 +2,9 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from typing import Any, Dict, Optional
-import time
 import json
+import sys
+import time
 
 @dataclass
 class GiftEvent:
@@ -19,7 +20,7 @@ class GiftEvent:
 
 GUARD_LEVEL_NAMES = {1: "总督", 2: "提督", 3: "舰长"}
 
-SUPPORTED_GIFT_CMDS = {"SEND_GIFT", "COMBO_SEND", "GUARD_BUY"}
+SUPPORTED_GIFT_CMDS = frozenset({"SEND_GIFT", "COMBO_SEND", "GUARD_BUY"})
 INTERACT_SHARE_MSG_TYPE = 3
 SHARE_GIFT_ID = -100
 SHARE_GIFT_NAME = "分享了直播间"
@@ -121,12 +122,14 @@ def _extract_uid(candidates: list[dict[str, Any]]) -> int:
         return 0
 
 
-def probe_share_event(event: Dict[str, Any]) -> Dict[str, Any]:
+def probe_share_event(
+    event: Dict[str, Any], *, cmd: Optional[str] = None, data: Any = None
+) -> Dict[str, Any]:
     """Return key fields used for share-event diagnostics."""
 
-    cmd_raw = event.get("cmd") or event.get("command") or event.get("type")
-    cmd = normalize_cmd(cmd_raw)
-    outer_data = event.get("data")
+    if cmd is None:
+        cmd = normalize_cmd(event.get("cmd") or event.get("command") or event.get("type"))
+    outer_data = event.get("data") if data is None else data
     candidates = _iter_candidate_dicts(outer_data)
     if isinstance(event, dict):
         candidates.extend(_iter_candidate_dicts(event))
@@ -156,12 +159,20 @@ def probe_share_event(event: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def parse_guard_buy(event: Dict[str, Any], room_id: int) -> Optional[GiftEvent]:
-    cmd = normalize_cmd(event.get("cmd") or event.get("command"))
+def parse_guard_buy(
+    event: Dict[str, Any],
+    room_id: int,
+    *,
+    cmd: Optional[str] = None,
+    data: Any = None,
+) -> Optional[GiftEvent]:
+    # cmd/data 由调用方预先解析时直接传入，可省去再次读取和拷贝事件。
+    if cmd is None:
+        cmd = normalize_cmd(event.get("cmd") or event.get("command"))
     if cmd != "GUARD_BUY":
         return None
 
-    outer_data = event.get("data") or {}
+    outer_data = (event.get("data") if data is None else data) or {}
     inner_data = outer_data.get("data") if isinstance(outer_data, dict) else None
     data = inner_data if isinstance(inner_data, dict) else outer_data if isinstance(outer_data, dict) else {}
     try:
@@ -176,6 +187,7 @@ def parse_guard_buy(event: Dict[str, Any], room_id: int) -> Optional[GiftEvent]:
         guard_level = 0
 
     gift_name = str(data.get("gift_name") or _resolve_guard_name(guard_level)).strip() or "大航海"
+    gift_name = sys.intern(gift_name)
 
     try:
         num = int(data.get("num") or 1)
@@ -210,14 +222,20 @@ def parse_guard_buy(event: Dict[str, Any], room_id: int) -> Optional[GiftEvent]:
 
 
 def parse_send_gift(
-    event: Dict[str, Any], room_id: int, *, allow_unknown_cmd: bool = False
+    event: Dict[str, Any],
+    room_id: int,
+    *,
+    allow_unknown_cmd: bool = False,
+    cmd: Optional[str] = None,
+    data: Any = None,
 ) -> Optional[GiftEvent]:
     # 兼容不同封装形态
-    cmd = normalize_cmd(event.get("cmd") or event.get("command"))
+    if cmd is None:
+        cmd = normalize_cmd(event.get("cmd") or event.get("command"))
     if not allow_unknown_cmd and cmd not in SUPPORTED_GIFT_CMDS:
         return None
 
-    outer_data = event.get("data") or {}
+    outer_data = (event.get("data") if data is None else data) or {}
     inner_data = outer_data.get("data") if isinstance(outer_data, dict) else None
     if isinstance(inner_data, (list, tuple)) and inner_data and isinstance(inner_data[0], dict):
         inner_data = inner_data[0]
@@ -237,6 +255,8 @@ def parse_send_gift(
         or gift_dict.get("gift_name")
         or ""
     ).strip()
+    # 礼物名种类有限，驻留后下游按礼物名聚合的 dict 查找可走指针比较快路径。
+    gift_name = sys.intern(gift_name)
     try:
         gift_id = int(
             data.get("giftId")
@@ -296,12 +316,19 @@ def parse_send_gift(
     )
 
 
-def parse_share_event(event: Dict[str, Any], room_id: int) -> Optional[GiftEvent]:
-    cmd = normalize_cmd(event.get("cmd") or event.get("command") or event.get("type"))
+def parse_share_event(
+    event: Dict[str, Any],
+    room_id: int,
+    *,
+    cmd: Optional[str] = None,
+    data: Any = None,
+) -> Optional[GiftEvent]:
+    if cmd is None:
+        cmd = normalize_cmd(event.get("cmd") or event.get("command") or event.get("type"))
     if cmd != "INTERACT_WORD":
         return None
 
-    outer_data = event.get("data")
+    outer_data = event.get("data") if data is None else data
     candidates = _iter_candidate_dicts(outer_data)
     if isinstance(event, dict):
         candidates.extend(_iter_candidate_dicts(event))
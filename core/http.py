@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from core.bili_headers import BILI_HEADERS, ROOM_INIT_URL
+
+# room_init 等探测接口的统一超时，避免每次请求都重新构造 ClientTimeout。
+PROBE_TIMEOUT = aiohttp.ClientTimeout(total=5)
+
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_shared_session() -> aiohttp.ClientSession:
+    """Return a process-wide session so bilibili probes reuse pooled connections.
+
+    Must be called from a running event loop. A new session is created if the
+    previous one was closed or belongs to another loop.
+    """
+
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=10,
+            limit_per_host=4,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=PROBE_TIMEOUT,
+            headers=BILI_HEADERS,
+        )
+        _session_loop = loop
+    return _session
+
+
+async def close_shared_session() -> None:
+    global _session, _session_loop
+    session = _session
+    _session = None
+    _session_loop = None
+    if session is not None and not session.closed:
+        await session.close()
+
+
+async def fetch_room_init(room_id: int) -> Dict[str, Any]:
+    """Fetch the room_init payload; network/HTTP errors propagate to the caller."""
+
+    session = get_shared_session()
+    async with session.get(ROOM_INIT_URL.format(room_id=room_id), timeout=PROBE_TIMEOUT) as resp:
+        resp.raise_for_status()
+        return await resp.json()
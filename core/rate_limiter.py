@@ -4,6 +4,8 @@ import time
 from dataclasses import dataclass, field
 from typing import Any, Dict, Optional
 
+from core.day_key import DayKeyCache
+
 
 @dataclass
 class RateLimitDecision:
@@ -14,49 +16,101 @@ class RateLimitDecision:
 
 @dataclass
 class RateLimiter:
+    """Token buckets for thanks: a global one plus one per user.
+
+    Per-user buckets hold up to ``burst`` tokens and refill one token per
+    cooldown period, so one user's short burst (e.g. a COMBO_SEND stream) is
+    allowed without any cmd-specific bypass. The global bucket always holds a
+    single token, so different users are still spaced by the global cooldown.
+    ``burst=1`` is the plain per-cooldown limiter.
+    """
+
     global_cooldown_sec: int
     per_user_cooldown_sec: int
     per_user_daily_limit: int = 0
+    burst: int = 1
 
-    _last_global_ts: float = field(default=0.0, init=False)
-    _last_user_ts: Dict[Any, float] = field(default_factory=dict, init=False)
+    _global_bucket: Optional[tuple[float, float]] = field(default=None, init=False)
+    # uid -> (tokens, last_ts)
+    _user_buckets: Dict[Any, tuple[float, float]] = field(default_factory=dict, init=False)
     _user_day: Dict[Any, str] = field(default_factory=dict, init=False)
     _user_day_count: Dict[Any, int] = field(default_factory=dict, init=False)
+    _current_day: Optional[str] = field(default=None, init=False)
+    _day_keys: DayKeyCache = field(default_factory=DayKeyCache, init=False)
 
     def _day_key(self, ts: float) -> str:
-        return time.strftime("%Y-%m-%d", time.localtime(ts))
+        return self._day_keys.day_key(ts)
+
+    def _capacity(self) -> float:
+        return float(max(self.burst, 1))
+
+    @staticmethod
+    def _refill(
+        bucket: Optional[tuple[float, float]], cooldown_sec: int, now: float, capacity: float
+    ) -> float:
+        if bucket is None:
+            return capacity
+        tokens, last_ts = bucket
+        return min(capacity, tokens + max(now - last_ts, 0.0) / cooldown_sec)
+
+    def _prune(self, day: str, now: float) -> None:
+        """Drop per-user state that can no longer affect a decision.
 
-    def allow(
-        self, uid: Any, ts: float | None = None, ignore_cooldown: bool = False
-    ) -> bool:
-        return self.allow_with_reason(uid, ts=ts, ignore_cooldown=ignore_cooldown).allowed
+        Runs once per day rollover so the maps hold only today's users instead of
+        every user seen since the process started.
+        """
 
-    def allow_with_reason(
-        self, uid: Any, ts: float | None = None, ignore_cooldown: bool = False
-    ) -> RateLimitDecision:
+        stale = [uid for uid, seen_day in self._user_day.items() if seen_day != day]
+        for uid in stale:
+            del self._user_day[uid]
+            self._user_day_count.pop(uid, None)
+
+        # 已回满的令牌桶与不存在时等价，可以直接丢掉。
+        cooldown = self.per_user_cooldown_sec
+        if cooldown <= 0:
+            self._user_buckets = {}
+            return
+        capacity = self._capacity()
+        self._user_buckets = {
+            uid: bucket
+            for uid, bucket in self._user_buckets.items()
+            if bucket[0] + (now - bucket[1]) / cooldown < capacity
+        }
+
+    def allow(self, uid: Any, ts: float | None = None) -> bool:
+        return self.allow_with_reason(uid, ts=ts).allowed
+
+    def allow_with_reason(self, uid: Any, ts: float | None = None) -> RateLimitDecision:
         now = ts or time.time()
 
-        if not ignore_cooldown:
-            if self.global_cooldown_sec > 0:
-                remaining = self.global_cooldown_sec - (now - self._last_global_ts)
-                if remaining > 0:
-                    return RateLimitDecision(
-                        allowed=False,
-                        reason="global_cooldown",
-                        retry_after=remaining,
-                    )
-
-            last = self._last_user_ts.get(uid, 0.0)
-            if self.per_user_cooldown_sec > 0:
-                remaining = self.per_user_cooldown_sec - (now - last)
-                if remaining > 0:
-                    return RateLimitDecision(
-                        allowed=False,
-                        reason="per_user_cooldown",
-                        retry_after=remaining,
-                    )
+        global_tokens: Optional[float] = None
+        if self.global_cooldown_sec > 0:
+            # 全局桶容量固定为 1：burst 只放宽同一用户的连续感谢，不让多位用户同时被感谢。
+            global_tokens = self._refill(self._global_bucket, self.global_cooldown_sec, now, 1.0)
+            if global_tokens < 1:
+                return RateLimitDecision(
+                    allowed=False,
+                    reason="global_cooldown",
+                    retry_after=(1 - global_tokens) * self.global_cooldown_sec,
+                )
+
+        user_tokens: Optional[float] = None
+        if self.per_user_cooldown_sec > 0:
+            user_tokens = self._refill(
+                self._user_buckets.get(uid), self.per_user_cooldown_sec, now, self._capacity()
+            )
+            if user_tokens < 1:
+                return RateLimitDecision(
+                    allowed=False,
+                    reason="per_user_cooldown",
+                    retry_after=(1 - user_tokens) * self.per_user_cooldown_sec,
+                )
 
         day = self._day_key(now)
+        if day != self._current_day:
+            if self._current_day is not None:
+                self._prune(day, now)
+            self._current_day = day
         last_day = self._user_day.get(uid)
         daily_count = self._user_day_count.get(uid, 0)
         if last_day != day:
@@ -69,8 +123,10 @@ class RateLimiter:
                 daily_count=daily_count,
             )
 
-        self._last_global_ts = now
-        self._last_user_ts[uid] = now
+        if global_tokens is not None:
+            self._global_bucket = (global_tokens - 1, now)
+        if user_tokens is not None:
+            self._user_buckets[uid] = (user_tokens - 1, now)
         self._user_day[uid] = day
         self._user_day_count[uid] = daily_count + 1
         return RateLimitDecision(
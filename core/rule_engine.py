@@ -3,8 +3,8 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import Any, Dict, Iterable
 import unicodedata
-import time
 
+from core.day_key import DayKeyCache
 from core.gift_parser import GiftEvent
 
 def _normalize_gift_name(name: str) -> str:
@@ -72,9 +72,10 @@ class DailyGiftCounter:
 
     _current_day: str | None = field(default=None, init=False)
     _counts: Dict[Any, int] = field(default_factory=dict, init=False)
+    _day_keys: DayKeyCache = field(default_factory=DayKeyCache, init=False)
 
     def _day_key(self, ts: float) -> str:
-        return time.strftime("%Y-%m-%d", time.localtime(ts))
+        return self._day_keys.day_key(ts)
 
     def add(self, key: Any, amount: int, ts: float) -> tuple[str, int]:
         """Add `amount` to the user's daily total and return (day, total)."""
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 import logging
 
 from config.settings import Settings
@@ -15,7 +15,13 @@ from db.sqlite import get_conn
 logger = logging.getLogger(__name__)
 
 
-def insert_gift(settings: Settings, gift: GiftEvent) -> None:
+_INSERT_GIFT_SQL = """
+INSERT INTO gifts(ts, room_id, uid, uname, gift_id, gift_name, num, total_price, raw_json)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _gift_row(settings: Settings, gift: GiftEvent) -> tuple:
     stored_payload = normalize_payload(
         mode=settings.raw_event_storage_mode,
         fallback_payload=gift.raw_json,
@@ -30,24 +36,50 @@ def insert_gift(settings: Settings, gift: GiftEvent) -> None:
             total_price=gift.total_price,
         ),
     )
+    return (
+        gift.ts,
+        gift.room_id,
+        gift.uid,
+        gift.uname,
+        gift.gift_id,
+        gift.gift_name,
+        gift.num,
+        gift.total_price,
+        stored_payload,
+    )
+
+
+# 每个房间的礼物写入版本号存于 app_meta，随新增/删除在同一事务内 +1；
+# 网页端据此生成 ETag，不必为判断「是否有变化」去扫描 gifts 表。
+_GIFTS_VERSION_KEY = "gifts_version:{room_id}"
+_BUMP_GIFTS_VERSION_SQL = """
+INSERT INTO app_meta(key, value) VALUES (?, '1')
+ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+"""
+
+
+def _bump_gifts_version(conn, room_ids) -> None:
+    conn.executemany(
+        _BUMP_GIFTS_VERSION_SQL,
+        [(_GIFTS_VERSION_KEY.format(room_id=room_id),) for room_id in room_ids],
+    )
+
+
+def insert_gift(settings: Settings, gift: GiftEvent) -> None:
     with get_conn(settings) as conn:
-        conn.execute(
-            """
-            INSERT INTO gifts(ts, room_id, uid, uname, gift_id, gift_name, num, total_price, raw_json)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                gift.ts,
-                gift.room_id,
-                gift.uid,
-                gift.uname,
-                gift.gift_id,
-                gift.gift_name,
-                gift.num,
-                gift.total_price,
-                stored_payload,
-            ),
-        )
+        conn.execute(_INSERT_GIFT_SQL, _gift_row(settings, gift))
+        _bump_gifts_version(conn, (gift.room_id,))
+
+
+def insert_gifts_bulk(settings: Settings, gifts: List[GiftEvent]) -> None:
+    """Insert several gifts in one transaction."""
+
+    if not gifts:
+        return
+    rows = [_gift_row(settings, gift) for gift in gifts]
+    with get_conn(settings) as conn:
+        conn.executemany(_INSERT_GIFT_SQL, rows)
+        _bump_gifts_version(conn, {gift.room_id for gift in gifts})
 
 
 def insert_danmaku_event(
@@ -93,6 +125,24 @@ def query_danmaku_events(settings: Settings, start_ts: int, end_ts: int) -> list
         return cur.fetchall()
 
 
+def iter_danmaku_events(settings: Settings, start_ts: int, end_ts: int) -> Iterator[tuple]:
+    """Yield danmaku rows in a range straight from the cursor instead of building a list."""
+
+    conn = get_conn(settings)
+    try:
+        cur = conn.execute(
+            """
+            SELECT uid, uname, content, ts
+            FROM danmaku_events
+            WHERE room_id = ? AND ts >= ? AND ts < ?
+            """,
+            (settings.room_id, start_ts, end_ts),
+        )
+        yield from cur
+    finally:
+        conn.close()
+
+
 def query_gift_totals_by_user(settings: Settings, start_ts: int, end_ts: int) -> Dict[str, int]:
     with get_conn(settings) as conn:
         cur = conn.execute(
@@ -213,10 +263,14 @@ def query_gifts_by_uname(
     start_ts: int | None = None,
     end_ts: int | None = None,
     guard_level: int | None = None,
+    gift_name: str | None = None,
 ) -> List[Tuple]:
     with get_conn(settings) as conn:
         clauses: list[str] = ["room_id = ?", "uname = ?"]
         params: list[object] = [settings.room_id, uname]
+        if gift_name:
+            clauses.append("gift_name = ?")
+            params.append(gift_name)
         _append_ts_clauses(conn, clauses, params, start_ts, end_ts)
 
         guard_clause, guard_params = _guard_level_clause(guard_level)
@@ -248,29 +302,15 @@ def query_gifts_by_uname_and_gift(
     end_ts: int | None = None,
     guard_level: int | None = None,
 ) -> List[Tuple]:
-    with get_conn(settings) as conn:
-        clauses: list[str] = ["room_id = ?", "uname = ?", "gift_name = ?"]
-        params: list[object] = [settings.room_id, uname, gift_name]
-        _append_ts_clauses(conn, clauses, params, start_ts, end_ts)
-
-        guard_clause, guard_params = _guard_level_clause(guard_level)
-        if guard_clause:
-            clauses.append(guard_clause.removeprefix(" AND "))
-            params.extend(guard_params)
-
-        where = "WHERE " + " AND ".join(clauses)
-
-        cur = conn.execute(
-            f"""
-            SELECT id, ts, uid, uname, gift_name, num, total_price
-            FROM gifts
-            {where}
-            ORDER BY ts DESC
-            LIMIT ?
-            """,
-            (*params, limit),
-        )
-        return cur.fetchall()
+    return query_gifts_by_uname(
+        settings,
+        uname=uname,
+        limit=limit,
+        start_ts=start_ts,
+        end_ts=end_ts,
+        guard_level=guard_level,
+        gift_name=gift_name,
+    )
 
 
 def _recent_gift_where_params(
@@ -348,10 +388,17 @@ def query_recent_gifts_paginated(
     uname: str | None = None,
     gift_name: str | None = None,
     guard_level: int | None = None,
-) -> tuple[int, list[Tuple]]:
+    after: tuple[int, int] | None = None,
+) -> tuple[int | None, list[Tuple], bool]:
+    """Return ``(total, rows, has_more)`` ordered by ``ts DESC, id DESC``.
+
+    With ``after=(ts, id)`` (the last row of the previous page) the page is read by
+    keyset instead of OFFSET, so deep pages cost the same as the first one; the
+    total count is skipped in that mode and returned as ``None``.
+    """
+
     page = max(page, 1)
     page_size = max(page_size, 1)
-    offset = (page - 1) * page_size
 
     with get_conn(settings) as conn:
         where, params = _recent_gift_where_params(
@@ -364,25 +411,49 @@ def query_recent_gifts_paginated(
             guard_level=guard_level,
         )
 
-        count_cur = conn.execute(
-            f"SELECT COUNT(*) FROM gifts {where}",
-            params,
-        )
-        total = int(count_cur.fetchone()[0] or 0)
-
+        total: int | None = None
+        if after is None:
+            count_cur = conn.execute(
+                f"SELECT COUNT(*) FROM gifts {where}",
+                params,
+            )
+            total = int(count_cur.fetchone()[0] or 0)
+            page_clause = "LIMIT ? OFFSET ?"
+            page_params: list[object] = [page_size + 1, (page - 1) * page_size]
+        else:
+            after_ts, after_id = after
+            keyset = "(ts < ? OR (ts = ? AND id < ?))"
+            where = f"{where} AND {keyset}" if where else f"WHERE {keyset}"
+            params = [*params, after_ts, after_ts, after_id]
+            page_clause = "LIMIT ?"
+            page_params = [page_size + 1]
+
+        # 多取一行用来判断是否还有下一页。
         cur = conn.execute(
             f"""
             SELECT id, ts, uid, uname, gift_name, num, total_price
             FROM gifts
             {where}
-            ORDER BY ts DESC
-            LIMIT ? OFFSET ?
+            ORDER BY ts DESC, id DESC
+            {page_clause}
             """,
-            (*params, page_size, offset),
+            (*params, *page_params),
         )
         rows = cur.fetchall()
 
-    return total, rows
+    has_more = len(rows) > page_size
+    return total, rows[:page_size], has_more
+
+
+def query_gifts_version(settings: Settings) -> int:
+    """Return the room's gift write version; bumped on every insert or delete."""
+
+    with get_conn(settings) as conn:
+        row = conn.execute(
+            "SELECT value FROM app_meta WHERE key = ?",
+            (_GIFTS_VERSION_KEY.format(room_id=settings.room_id),),
+        ).fetchone()
+    return int(row[0]) if row and row[0] is not None else 0
 
 
 def query_gift_by_id(settings: Settings, gift_id: int) -> Optional[Tuple]:
@@ -404,7 +475,10 @@ def delete_gift_by_id(settings: Settings, gift_id: int) -> bool:
         cur = conn.execute(
             "DELETE FROM gifts WHERE id = ? AND room_id = ?", (gift_id, settings.room_id)
         )
-        return cur.rowcount > 0
+        deleted = cur.rowcount > 0
+        if deleted:
+            _bump_gifts_version(conn, (settings.room_id,))
+        return deleted
 
 
 def query_flow_summary(settings: Settings, start_ts: int | None = None, end_ts: int | None = None) -> dict[str, int]:
@@ -457,33 +531,60 @@ def query_flow_summary(settings: Settings, start_ts: int | None = None, end_ts:
     }
 
 
-def query_blind_box_totals(
+BlindBoxKey = Tuple[Optional[int], Optional[str]]
+
+
+def _unit_price(settings: Settings, gift_id: int | None, gift_name: str | None) -> int | None:
+    if gift_id and gift_id in settings.gift_price_by_id:
+        return settings.gift_price_by_id[gift_id]
+    if gift_name and gift_name in settings.gift_price_by_name:
+        return settings.gift_price_by_name[gift_name]
+    return None
+
+
+def query_blind_box_totals_bulk(
     settings: Settings,
     *,
-    uid: int | None,
-    uname: str | None,
+    keys: List[BlindBoxKey],
     base_gift: str,
     reward_gifts: list[str],
     start_ts: int | None = None,
     end_ts: int | None = None,
-) -> tuple[int, int]:
-    def _aggregate(conn, gift_names: list[str]) -> tuple[int, int]:
-        clauses = ["room_id = ?"]
-        params: list[object] = [settings.room_id]
+) -> Dict[BlindBoxKey, tuple[int, int]]:
+    """Return ``{(uid, uname): (base_total, reward_total)}`` using one aggregate query.
 
-        if uid:
-            clauses.append("uid = ?")
-            params.append(uid)
-        elif uname:
-            clauses.append("uname = ?")
-            params.append(uname)
+    A key with a uid matches by uid, otherwise by uname; ``(None, None)`` covers
+    the whole room.
+    """
+
+    uids = sorted({uid for uid, _ in keys if uid})
+    unames = sorted({uname for uid, uname in keys if not uid and uname})
+    match_all = any(not uid and not uname for uid, uname in keys)
+
+    clauses = ["room_id = ?"]
+    params: list[object] = [settings.room_id]
+    if not match_all:
+        who = []
+        if uids:
+            who.append(f"uid IN ({','.join(['?'] * len(uids))})")
+            params.extend(uids)
+        if unames:
+            who.append(f"uname IN ({','.join(['?'] * len(unames))})")
+            params.extend(unames)
+        clauses.append("(" + " OR ".join(who) + ")")
+
+    # (scope, gift_id, gift_name) -> [num, stored_total]，scope 为 ("uid", uid) / ("uname", uname) / ("all",)
+    grouped: Dict[tuple, list[int]] = {}
+    uid_set = set(uids)
+    uname_set = set(unames)
 
+    with get_conn(settings) as conn:
         _append_ts_clauses(conn, clauses, params, start_ts, end_ts)
 
-        if gift_names:
-            placeholders = ",".join(["?"] * len(gift_names))
+        if reward_gifts:
+            placeholders = ",".join(["?"] * len(reward_gifts))
             clauses.append(f"gift_name IN ({placeholders})")
-            params.extend(gift_names)
+            params.extend(reward_gifts)
         elif base_gift.strip():
             clauses.append("gift_name != ?")
             params.append(base_gift.strip())
@@ -492,61 +593,97 @@ def query_blind_box_totals(
         cur = conn.execute(
             f"""
             SELECT
+              uid,
+              uname,
               gift_id,
               gift_name,
               COALESCE(SUM(num), 0) as total_num,
               COALESCE(SUM(total_price), 0) as total_price
             FROM gifts
             WHERE {where}
-            GROUP BY gift_id, gift_name
+            GROUP BY uid, uname, gift_id, gift_name
             """,
             params,
         )
         rows = cur.fetchall() or []
 
-        reward_total = 0
-        total_reward_count = 0
-        price_details = []
-        for gift_id, gift_name, num_total, stored_total in rows:
-            num_total_int = int(num_total or 0)
-            total_reward_count += num_total_int
-
-            unit_price = None
-            if gift_id and gift_id in settings.gift_price_by_id:
-                unit_price = settings.gift_price_by_id[gift_id]
-            elif gift_name and gift_name in settings.gift_price_by_name:
-                unit_price = settings.gift_price_by_name[gift_name]
-
-            if unit_price is not None:
-                calculated_total = unit_price * max(num_total_int, 1)
-            else:
-                calculated_total = int(stored_total or 0)
-
-            reward_total += calculated_total
-
-            if logger.isEnabledFor(logging.DEBUG):
-                price_details.append(
-                    {
-                        "gift_id": gift_id,
-                        "gift_name": gift_name,
-                        "num": num_total_int,
-                        "unit_price": unit_price,
-                        "stored_total": int(stored_total or 0),
-                        "calculated_total": calculated_total,
-                    }
-                )
-
-        if logger.isEnabledFor(logging.DEBUG):
-            logger.debug("盲盒收益礼物明细: %s", price_details)
-
-        return reward_total, total_reward_count
-
-    with get_conn(settings) as conn:
-        reward_total, reward_count = _aggregate(conn, reward_gifts)
+    for uid, uname, gift_id, gift_name, num_total, stored_total in rows:
+        scopes = []
+        if uid in uid_set:
+            scopes.append(("uid", uid))
+        if uname in uname_set:
+            scopes.append(("uname", uname))
+        if match_all:
+            scopes.append(("all",))
+        for scope in scopes:
+            bucket = grouped.setdefault((scope, gift_id, gift_name), [0, 0])
+            bucket[0] += int(num_total or 0)
+            bucket[1] += int(stored_total or 0)
+
+    # 单价按 (礼物 id, 礼物名) 汇总后再计算，与逐用户查询的结果保持一致。
+    totals: Dict[tuple, list[int]] = {}
+    price_details = []
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for (scope, gift_id, gift_name), (num_total_int, stored_total_int) in grouped.items():
+        unit_price = _unit_price(settings, gift_id, gift_name)
+        if unit_price is not None:
+            calculated_total = unit_price * max(num_total_int, 1)
+        else:
+            calculated_total = stored_total_int
+
+        acc = totals.setdefault(scope, [0, 0])
+        acc[0] += calculated_total
+        acc[1] += num_total_int
+
+        if debug:
+            price_details.append(
+                {
+                    "scope": scope,
+                    "gift_id": gift_id,
+                    "gift_name": gift_name,
+                    "num": num_total_int,
+                    "unit_price": unit_price,
+                    "stored_total": stored_total_int,
+                    "calculated_total": calculated_total,
+                }
+            )
+
+    if debug:
+        logger.debug("盲盒收益礼物明细: %s", price_details)
+
+    results: Dict[BlindBoxKey, tuple[int, int]] = {}
+    for key in keys:
+        uid, uname = key
+        if uid:
+            scope: tuple = ("uid", uid)
+        elif uname:
+            scope = ("uname", uname)
+        else:
+            scope = ("all",)
+        reward_total, reward_count = totals.get(scope, (0, 0))
+        results[key] = (reward_count * 15000, reward_total)
+    return results
 
-    base_total = reward_count * 15000
 
-    return base_total, reward_total
+def query_blind_box_totals(
+    settings: Settings,
+    *,
+    uid: int | None,
+    uname: str | None,
+    base_gift: str,
+    reward_gifts: list[str],
+    start_ts: int | None = None,
+    end_ts: int | None = None,
+) -> tuple[int, int]:
+    key = (uid, uname)
+    return query_blind_box_totals_bulk(
+        settings,
+        keys=[key],
+        base_gift=base_gift,
+        reward_gifts=reward_gifts,
+        start_ts=start_ts,
+        end_ts=end_ts,
+    )[key]
 
 
 def query_share_leaderboard(
@@ -16,6 +16,7 @@ CREATE INDEX IF NOT EXISTS idx_gifts_gift  ON gifts(gift_name);
 CREATE INDEX IF NOT EXISTS idx_gifts_ts    ON gifts(ts);
 CREATE INDEX IF NOT EXISTS idx_gifts_room  ON gifts(room_id);
 CREATE INDEX IF NOT EXISTS idx_gifts_room_ts ON gifts(room_id, ts);
+CREATE INDEX IF NOT EXISTS idx_gifts_room_uname_gift_ts ON gifts(room_id, uname, gift_name, ts);
 
 CREATE TABLE IF NOT EXISTS danmaku_queue (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
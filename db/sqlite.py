@@ -1,7 +1,21 @@
 from __future__ import annotations
 
+import os
 import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator
+
+try:  # pragma: no cover - 平台兼容处理
+    import fcntl  # type: ignore
+except ImportError:  # Windows 平台不存在 fcntl
+    fcntl = None
+    try:
+        import msvcrt  # type: ignore
+    except ImportError:  # pragma: no cover - 理论不会发生
+        msvcrt = None
+else:
+    msvcrt = None
 
 from config.settings import Settings
 from db.event_storage import (
@@ -489,7 +503,49 @@ def _compact_legacy_payloads(conn: sqlite3.Connection, settings: Settings) -> No
         _debug_log("payload compaction found no rows to rewrite")
 
 
+@contextmanager
+def _init_lock(db_path: str) -> Iterator[None]:
+    """Serialize init_db across processes (multiple web workers, collectors).
+
+    The migrations below are check-then-act (ALTER TABLE, table rebuilds,
+    compaction + VACUUM); run concurrently they race on the same file.
+    """
+
+    if db_path == ":memory:" or (fcntl is None and msvcrt is None):
+        yield
+        return
+
+    fd = os.open(f"{db_path}.init.lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK 重试约 10 秒后仍未拿到锁会抛错，继续等待
+                    continue
+        yield
+    finally:
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+        os.close(fd)
+
+
 def init_db(settings: Settings) -> None:
+    # 后到的进程拿到锁时迁移已完成，各步骤的检查都会直接跳过。
+    with _init_lock(settings.db_path):
+        _init_db_locked(settings)
+
+
+def _init_db_locked(settings: Settings) -> None:
     schema_path = Path(__file__).with_name("schema.sql")
     schema_sql = schema_path.read_text(encoding="utf-8")
     with get_conn(settings) as conn:
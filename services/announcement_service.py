@@ -1,10 +1,10 @@
 from __future__ import annotations
 
 import asyncio
-import contextlib
 import logging
 import os
 import tempfile
+import time
 from pathlib import Path
 from typing import Optional, Any
 
@@ -22,11 +22,26 @@ except ImportError:  # Windows 平台不存在 fcntl
 else:
     msvcrt = None
 
-import aiohttp
 from bilibili_api import live
 
-from config.settings import Settings, get_settings
+from config.settings import Settings, SettingsReloader
 from core.danmaku_sender import DanmakuSender
+from core.http import fetch_room_init
+
+# 最近 60 秒内有弹幕、且 10 分钟内 room_init 确认过开播时，直接视为仍在直播。
+# 下播后房间依然可能有人聊天，所以弹幕活跃本身不足以证明开播，需要结合最近一次探测结果。
+_RECENT_EVENT_SEC = 60.0
+_LIVE_CONFIRM_TTL_SEC = 600.0
+
+
+async def _cancel_task(task: Optional[asyncio.Task]) -> None:
+    if task is None or task.done():
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
 
 
 class AnnouncementService:
@@ -38,12 +53,19 @@ class AnnouncementService:
         self.sender = sender
         self.logger = logging.getLogger(__name__)
         self._task: Optional[asyncio.Task] = None
+        self._settings_reloader = SettingsReloader(env_file)
         self._message_index: int = 0
-        self._last_messages: list[str] | None = None
+        self._messages_source: list[str] | None = None
+        self._messages: tuple[str, ...] = ()
         self._credential = getattr(sender, "credential", None)
         self._danmaku: Optional[live.LiveDanmaku] = None
         self._danmaku_task: Optional[asyncio.Task] = None
         self._danmaku_count: int = 0
+        self._threshold: int = 1
+        self._mc_enabled: bool = False
+        self._last_event_ts: float = 0.0
+        self._live_confirmed_ts: float | None = None
+        self._apply_settings(settings)
         self._send_lock = asyncio.Lock()
         self._self_uid = getattr(getattr(sender, "credential", None), "dedeuserid", None)
         self._last_log_state: tuple[Any, ...] | None = None
@@ -52,36 +74,41 @@ class AnnouncementService:
             safe_env = Path(env_file).name.replace(os.sep, "_")
             lock_name += f"-{safe_env}"
         self._lock_path = Path(tempfile.gettempdir()) / f"{lock_name}.lock"
+        # os.open 在锁竞争时每 10 秒调用一次，提前转成 str，Path 仅用于日志展示。
+        self._lock_path_str = os.fspath(self._lock_path)
         self._lock_fd: Optional[int] = None
         self._lock_warned: bool = False
 
+    def _apply_settings(self, settings: Settings) -> None:
+        # 弹幕触发模式每条弹幕都会走 handle_danmaku_event，只在配置变化时重新计算这些值。
+        self.settings = settings
+        self._threshold = max(settings.announce_danmaku_threshold, 1)
+        self._mc_enabled = settings.announce_enabled and settings.announce_mode == "message_count"
+
     async def _is_live(self, settings: Settings) -> bool:
         if not settings.announce_skip_offline:
             return True
 
-        url = f"https://api.live.bilibili.com/room/v1/Room/room_init?id={settings.room_id}"
-        headers = {
-            # B 站接口如果没有常见浏览器 UA 会返回 412，补充请求头提升成功率。
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/127.0.0.0 Safari/537.36"
-            ),
-            "Referer": "https://live.bilibili.com/",
-        }
-        timeout = aiohttp.ClientTimeout(total=5)
         try:
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url, headers=headers) as resp:
-                    resp.raise_for_status()
-                    payload = await resp.json()
+            payload = await fetch_room_init(settings.room_id)
         except Exception as exc:
             self.logger.debug("定时弹幕检查直播状态失败", exc_info=exc)
             return False
 
         if payload.get("code") != 0 or not isinstance(payload.get("data"), dict):
             return False
-        return payload["data"].get("live_status") == 1
+        live_now = payload["data"].get("live_status") == 1
+        self._live_confirmed_ts = time.monotonic() if live_now else None
+        return live_now
+
+    def _recently_live(self) -> bool:
+        if self._live_confirmed_ts is None:
+            return False
+        now = time.monotonic()
+        return (
+            now - self._last_event_ts < _RECENT_EVENT_SEC
+            and now - self._live_confirmed_ts < _LIVE_CONFIRM_TTL_SEC
+        )
 
     async def handle_danmaku_event(self, event: dict[str, Any]) -> None:
         if self._danmaku_task is None or self._danmaku_task.done():
@@ -89,16 +116,22 @@ class AnnouncementService:
             if self._danmaku is not None:
                 return
 
-        settings = get_settings(self.env_file)
-        if settings.announce_mode != "message_count" or not settings.announce_enabled:
+        # 只做一次 mtime 比较：配置切到弹幕触发模式或修改阈值后，下一条弹幕即生效，
+        # 不必等 _loop 从间隔模式的长睡眠中醒来。
+        settings = self._settings_reloader.reload_if_changed()
+        if settings is not self.settings:
+            self._apply_settings(settings)
+
+        if not self._mc_enabled:
             return
 
         uid = self._extract_uid(event)
         if uid and self._self_uid and str(uid) == str(self._self_uid):
             return
 
+        self._last_event_ts = time.monotonic()
         self._danmaku_count += 1
-        threshold = max(settings.announce_danmaku_threshold, 1)
+        threshold = self._threshold
         if self._danmaku_count < threshold:
             self.logger.debug(
                 "弹幕触发计数：%s/%s（忽略自己发送的弹幕）", self._danmaku_count, threshold
@@ -107,7 +140,7 @@ class AnnouncementService:
 
         self._danmaku_count = 0
         self.logger.debug("弹幕触发计数达到阈值 %s，准备发送定时弹幕", threshold)
-        await self._send_next_message(settings)
+        await self._send_next_message(self.settings)
 
     # Backward-compatible alias.
     async def _handle_danmaku_event(self, event: dict[str, Any]) -> None:
@@ -119,7 +152,7 @@ class AnnouncementService:
 
         if fcntl:
             try:
-                fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+                fd = os.open(self._lock_path_str, os.O_RDWR | os.O_CREAT, 0o600)
                 fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
                 self._lock_fd = fd
                 return True
@@ -134,7 +167,7 @@ class AnnouncementService:
 
         if msvcrt:
             try:
-                fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+                fd = os.open(self._lock_path_str, os.O_RDWR | os.O_CREAT, 0o600)
                 msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
                 self._lock_fd = fd
                 return True
@@ -180,14 +213,27 @@ class AnnouncementService:
                     return None
         return None
 
+    def _resolve_messages(self, settings: Settings) -> tuple[str, ...]:
+        # SettingsReloader keeps returning the same Settings object until the env
+        # file changes, so identity is enough to skip the rebuild. Holding a reference
+        # to the source list also rules out id() reuse.
+        if settings.announce_messages is not self._messages_source:
+            self._messages_source = settings.announce_messages
+            messages = tuple(msg.strip() for msg in settings.announce_messages if msg.strip())
+            # 每次重新加载都会生成新列表；只有轮播内容真的变了才从第一条重新开始。
+            if messages != self._messages:
+                self._messages = messages
+                self._message_index = 0
+        return self._messages
+
     async def _send_next_message(self, settings: Settings) -> None:
-        messages = [msg.strip() for msg in settings.announce_messages if msg.strip()]
+        messages = self._resolve_messages(settings)
         if not settings.announce_enabled or not messages:
             return
 
         async with self._send_lock:
             try:
-                if not await self._is_live(settings):
+                if not self._recently_live() and not await self._is_live(settings):
                     self.logger.debug("房间未开播，跳过弹幕触发的定时弹幕")
                     return
                 message = messages[self._message_index % len(messages)]
@@ -238,16 +284,13 @@ class AnnouncementService:
         self._danmaku_task = asyncio.create_task(_runner())
 
     async def _stop_danmaku_listener(self) -> None:
-        if self._danmaku_task:
-            self._danmaku_task.cancel()
-            with contextlib.suppress(asyncio.CancelledError):
-                await self._danmaku_task
+        await _cancel_task(self._danmaku_task)
         self._danmaku_task = None
         self._danmaku = None
         self._danmaku_count = 0
 
     async def _loop(self) -> None:
-        # Reload settings on every iteration so config changes apply without restart.
+        # Poll the env file on every iteration so config changes apply without restart.
         try:
             while True:
                 try:
@@ -262,12 +305,11 @@ class AnnouncementService:
                         await asyncio.sleep(10)
                         continue
 
-                    settings = get_settings(self.env_file)
+                    settings = self._settings_reloader.reload_if_changed()
+                    if settings is not self.settings:
+                        self._apply_settings(settings)
                     interval = max(settings.announce_interval_sec, 30)
-                    messages = [msg.strip() for msg in settings.announce_messages if msg.strip()]
-                    if messages != self._last_messages:
-                        self._message_index = 0
-                        self._last_messages = list(messages)
+                    messages = self._resolve_messages(settings)
 
                     if not settings.announce_enabled or not messages:
                         signature = ("disabled", settings.announce_enabled, bool(messages))
@@ -281,7 +323,7 @@ class AnnouncementService:
                     if settings.announce_mode == "message_count":
                         signature = (
                             "message_count",
-                            max(settings.announce_danmaku_threshold, 1),
+                            self._threshold,
                             settings.announce_skip_offline,
                         )
                         if signature != self._last_log_state:
@@ -8,6 +8,7 @@ import urllib.request
 from typing import Any
 
 from config.settings import get_settings, resolve_env_file
+from core.bili_headers import BROWSER_USER_AGENT
 
 _CACHE_TTL_SEC = 300
 _CACHE_LOCK = threading.Lock()
@@ -63,11 +64,7 @@ def detect_bot_identity(env_file: str | None) -> dict[str, Any]:
     request = urllib.request.Request(
         "https://api.bilibili.com/x/web-interface/nav",
         headers={
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/127.0.0.0 Safari/537.36"
-            ),
+            "User-Agent": BROWSER_USER_AGENT,
             "Referer": "https://www.bilibili.com/",
             "Cookie": _cookie_header(sessdata, bili_jct, buvid3),
         },
@@ -14,6 +14,7 @@ def build_pipeline(settings: Settings, settings_reloader: SettingsReloader | Non
     limiter = RateLimiter(
         global_cooldown_sec=settings.thank_global_cooldown_sec,
         per_user_cooldown_sec=settings.thank_per_user_cooldown_sec,
+        burst=settings.thank_burst,
         per_user_daily_limit=settings.thank_per_user_daily_limit,
     )
 
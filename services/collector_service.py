@@ -10,6 +10,7 @@ from bilibili_api import live, Credential
 
 from config.settings import Settings
 from core.bili_client import get_bot_credential
+from core.bili_headers import BILI_HEADERS, ROOM_INIT_URL
 
 EventHandler = Callable[[Dict[str, Any]], Awaitable[None]]
 
@@ -48,6 +49,7 @@ class CollectorService:
         self.logger = logging.getLogger(__name__)
         self._credential = credential
         self._bound_handler: Optional[EventHandler] = None
+        self._bind_api = self._detect_bind_api()
         self._configure_danmaku_logger()
 
     def _configure_danmaku_logger(self) -> None:
@@ -74,27 +76,13 @@ class CollectorService:
         """Fetch room init info with asyncio + aiohttp to avoid urllib SSL errors on Windows."""
 
         try:
-            import aiohttp
+            from core.http import fetch_room_init
         except Exception as exc:  # pragma: no cover - 环境缺少 aiohttp 时回退
             self.logger.debug("aiohttp 不可用，跳过异步房间信息获取", exc_info=exc)
             return None
 
-        url = f"https://api.live.bilibili.com/room/v1/Room/room_init?id={self.settings.room_id}"
-        headers = {
-            # B 站接口如果没有常见浏览器 UA 会返回 412，补充请求头提升成功率。
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/127.0.0.0 Safari/537.36"
-            ),
-            "Referer": "https://live.bilibili.com/",
-        }
-        timeout = aiohttp.ClientTimeout(total=5)
         try:
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(url, headers=headers) as resp:
-                    resp.raise_for_status()
-                    return await resp.json()
+            return await fetch_room_init(self.settings.room_id)
         except Exception as exc:
             self.logger.debug("获取房间信息失败", exc_info=exc)
             return None
@@ -107,17 +95,9 @@ class CollectorService:
 
         # Fallback to urllib in case aiohttp is unavailable at runtime
         if payload is None:
-            url = f"https://api.live.bilibili.com/room/v1/Room/room_init?id={self.settings.room_id}"
-            headers = {
-                "User-Agent": (
-                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                    "AppleWebKit/537.36 (KHTML, like Gecko) "
-                    "Chrome/127.0.0.0 Safari/537.36"
-                ),
-                "Referer": "https://live.bilibili.com/",
-            }
+            url = ROOM_INIT_URL.format(room_id=self.settings.room_id)
             try:
-                request = urllib.request.Request(url, headers=headers)
+                request = urllib.request.Request(url, headers=BILI_HEADERS)
                 with urllib.request.urlopen(request, timeout=5) as resp:
                     payload_text = resp.read().decode("utf-8")
                 payload = json.loads(payload_text)
@@ -135,19 +115,23 @@ class CollectorService:
         elif payload is not None:
             self.logger.warning("无法获取房间信息：%s", payload)
 
-    def _bind(self, event_name: str, handler: EventHandler) -> bool:
-        try:
-            @self.danmaku.on(event_name)
-            async def _wrapped(event):
-                await handler(event)
-            self.logger.info("已绑定事件监听：%s", event_name)
-            return True
-        except Exception:
-            pass
+    def _detect_bind_api(self) -> str:
+        """Probe once which listener API this bilibili-api version exposes."""
 
+        if callable(getattr(self.danmaku, "on", None)):
+            return "decorator"
+        return "add_listener"
+
+    def _bind(self, event_name: str, handler: EventHandler) -> bool:
         try:
-            self.danmaku.add_event_listener(event_name, handler)  # type: ignore
-            self.logger.info("已通过 add_event_listener 绑定事件：%s", event_name)
+            if self._bind_api == "decorator":
+                @self.danmaku.on(event_name)
+                async def _wrapped(event):
+                    await handler(event)
+                self.logger.info("已绑定事件监听：%s", event_name)
+            else:
+                self.danmaku.add_event_listener(event_name, handler)  # type: ignore
+                self.logger.info("已通过 add_event_listener 绑定事件：%s", event_name)
             return True
         except Exception as exc:
             self.logger.debug("事件监听绑定失败：%s", event_name, exc_info=exc)
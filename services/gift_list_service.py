@@ -1,45 +1,128 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import concurrent.futures
+import functools
 import logging
-import socket
-import urllib.error
-import urllib.request
-from typing import Any, Dict, List
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional
+
+import aiohttp
 
 from config.settings import Settings
+from core import fastjson
 
 logger = logging.getLogger(__name__)
 
 
-def _fetch_payload(
-    url: str, headers: Dict[str, str], *, timeout: float | None = 3.0
-) -> Dict[str, Any] | None:
+@dataclass
+class GiftListResult:
+    """Outcome of a (possibly conditional) gift list fetch."""
+
+    gifts: List[Dict[str, Any]] = field(default_factory=list)
+    not_modified: bool = False
+    url: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+@dataclass
+class _Response:
+    url: str
+    payload: Dict[str, Any] | None = None
+    not_modified: bool = False
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def usable(self) -> bool:
+        return self.not_modified or bool(self.payload and self.payload.get("code") == 0)
+
+
+# 礼物清单请求统一跑在一个常驻后台事件循环上，ClientSession 随之长期存活，
+# 同步调用方（启动流程、FastAPI 同步路由）与异步调用方共用同一个 keep-alive 连接池。
+_LOOP: asyncio.AbstractEventLoop | None = None
+_LOOP_LOCK = threading.Lock()
+_SESSION: aiohttp.ClientSession | None = None
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="gift-list-http", daemon=True
+            ).start()
+            _LOOP = loop
+        return _LOOP
+
+
+def _submit(coro) -> concurrent.futures.Future:
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop())
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """Return the pooled session; only called on the background loop."""
+
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        connector = aiohttp.TCPConnector(
+            limit=8,
+            limit_per_host=4,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        _SESSION = aiohttp.ClientSession(connector=connector)
+    return _SESSION
+
+
+async def _fetch_payload(
+    session: aiohttp.ClientSession,
+    url: str,
+    headers: Mapping[str, str],
+    *,
+    timeout: float | None = 3.0,
+) -> _Response | None:
     """Attempt to fetch and decode the gift payload from the given URL."""
 
     try:
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            raw = resp.read().decode("utf-8")
-        return json.loads(raw)
-    except urllib.error.HTTPError as exc:  # pragma: no cover - network path
-        if exc.code == 404:
+        async with session.get(
+            url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as resp:
+            if resp.status == 304:
+                return _Response(url=url, not_modified=True)
+            resp.raise_for_status()
+            raw = await resp.read()
+            etag = resp.headers.get("ETag")
+            last_modified = resp.headers.get("Last-Modified")
+        return _Response(
+            url=url,
+            payload=fastjson.loads(raw),
+            etag=etag,
+            last_modified=last_modified,
+        )
+    except aiohttp.ClientResponseError as exc:  # pragma: no cover - network path
+        if exc.status == 404:
             logger.info("礼物清单接口不存在(HTTP 404)，将尝试备用接口：%s", url)
         else:
-            logger.warning("礼物清单接口请求失败(HTTP %s)：%s", exc.code, url)
+            logger.warning("礼物清单接口请求失败(HTTP %s)：%s", exc.status, url)
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("礼物清单接口 HTTP 错误详情", exc_info=exc)
         return None
-    except urllib.error.URLError as exc:  # pragma: no cover - network path
-        reason = getattr(exc, "reason", None)
-        if isinstance(reason, socket.timeout):
-            logger.warning("礼物清单接口请求超时：%s", url)
-        else:
-            logger.warning("礼物清单接口网络错误：%s reason=%s", url, reason)
+    except asyncio.TimeoutError as exc:  # pragma: no cover - network path
+        logger.warning("礼物清单接口请求超时：%s", url)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("礼物清单接口超时详情", exc_info=exc)
+        return None
+    except aiohttp.ClientError as exc:  # pragma: no cover - network path
+        logger.warning("礼物清单接口网络错误：%s reason=%s", url, exc)
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("礼物清单接口网络错误详情", exc_info=exc)
         return None
-    except json.JSONDecodeError as exc:  # pragma: no cover - network path
+    except fastjson.JSONDecodeError as exc:  # pragma: no cover - network path
         logger.warning("礼物清单接口返回非 JSON 数据：%s", url)
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("礼物清单 JSON 解析详情", exc_info=exc)
@@ -51,39 +134,7 @@ def _fetch_payload(
         return None
 
 
-def fetch_room_gift_list(
-    settings: Settings, *, timeout: float | None = 3.0
-) -> List[Dict[str, Any]]:
-    """Fetch the gift list for the configured room.
-
-    Returns a simplified schema suitable for the frontend. Tries the primary
-    giftList endpoint first and falls back to giftConfig if the former returns
-    an error such as HTTP 404.
-    """
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/117.0",
-        "Referer": f"https://live.bilibili.com/{settings.room_id}",
-        "Origin": "https://live.bilibili.com",
-    }
-
-    candidate_urls = [
-        "https://api.live.bilibili.com/xlive/web-room/v1/giftPanel/giftList"
-        f"?roomid={settings.room_id}&platform=pc&source=live",
-        "https://api.live.bilibili.com/xlive/web-room/v1/giftPanel/giftConfig"
-        f"?roomid={settings.room_id}&platform=pc&source=live",
-    ]
-
-    payload = None
-    for url in candidate_urls:
-        payload = _fetch_payload(url, headers, timeout=timeout)
-        if payload and payload.get("code") == 0:
-            break
-
-    if not payload or payload.get("code") != 0:
-        logger.warning("礼物清单接口返回异常：%s", payload)
-        return []
-
+def _simplify_gifts(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
     gifts = []
     data = payload.get("data") or {}
     for item in data.get("list", []):
@@ -97,5 +148,157 @@ def fetch_room_gift_list(
                 "gift_type": item.get("gift_type"),
             }
         )
-
     return gifts
+
+
+@functools.lru_cache(maxsize=16)
+def _build_request_specs(room_id: int) -> tuple[Mapping[str, str], tuple[str, ...]]:
+    """Return the (read-only) headers and candidate URLs for a room."""
+
+    headers = MappingProxyType(
+        {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/117.0",
+            "Referer": f"https://live.bilibili.com/{room_id}",
+            "Origin": "https://live.bilibili.com",
+        }
+    )
+    candidate_urls = (
+        "https://api.live.bilibili.com/xlive/web-room/v1/giftPanel/giftList"
+        f"?roomid={room_id}&platform=pc&source=live",
+        "https://api.live.bilibili.com/xlive/web-room/v1/giftPanel/giftConfig"
+        f"?roomid={room_id}&platform=pc&source=live",
+    )
+    return headers, candidate_urls
+
+
+async def _fetch_conditional(
+    settings: Settings,
+    *,
+    timeout: float | None = 3.0,
+    validator_url: Optional[str] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> GiftListResult:
+    headers, candidate_urls = _build_request_specs(settings.room_id)
+
+    conditional: Mapping[str, str] = headers
+    if etag or last_modified:
+        conditional = dict(headers)
+        if etag:
+            conditional["If-None-Match"] = etag
+        if last_modified:
+            conditional["If-Modified-Since"] = last_modified
+
+    winner: _Response | None = None
+    payload = None
+    session = _get_session()
+    tasks = [
+        asyncio.create_task(
+            _fetch_payload(
+                session,
+                url,
+                conditional if url == validator_url else headers,
+                timeout=timeout,
+            )
+        )
+        for url in candidate_urls
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            if result is None:
+                continue
+            if result.usable:
+                winner = result
+                break
+            payload = payload or result.payload
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if winner is None:
+        logger.warning("礼物清单接口返回异常：%s", payload)
+        return GiftListResult()
+
+    if winner.not_modified:
+        return GiftListResult(
+            not_modified=True, url=winner.url, etag=etag, last_modified=last_modified
+        )
+
+    return GiftListResult(
+        gifts=_simplify_gifts(winner.payload or {}),
+        url=winner.url,
+        etag=winner.etag,
+        last_modified=winner.last_modified,
+    )
+
+
+async def fetch_room_gift_list_conditional_async(
+    settings: Settings,
+    *,
+    timeout: float | None = 3.0,
+    validator_url: Optional[str] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> GiftListResult:
+    """Fetch the gift list, revalidating ``validator_url`` with the given validators.
+
+    The giftList and giftConfig endpoints are requested concurrently; the first
+    response with ``code == 0`` (or a 304 for ``validator_url``) wins and the
+    other request is cancelled. Requests run on the shared HTTP loop so the
+    pooled keep-alive connections are reused across calls.
+    """
+
+    coro = _fetch_conditional(
+        settings,
+        timeout=timeout,
+        validator_url=validator_url,
+        etag=etag,
+        last_modified=last_modified,
+    )
+    return await asyncio.wrap_future(_submit(coro))
+
+
+async def fetch_room_gift_list_async(
+    settings: Settings, *, timeout: float | None = 3.0
+) -> List[Dict[str, Any]]:
+    """Fetch the gift list for the configured room.
+
+    Returns a simplified schema suitable for the frontend.
+    """
+
+    result = await fetch_room_gift_list_conditional_async(settings, timeout=timeout)
+    return result.gifts
+
+
+def fetch_room_gift_list(
+    settings: Settings, *, timeout: float | None = 3.0
+) -> List[Dict[str, Any]]:
+    """Blocking wrapper around :func:`fetch_room_gift_list_async`."""
+
+    return fetch_room_gift_list_conditional(settings, timeout=timeout).gifts
+
+
+def fetch_room_gift_list_conditional(
+    settings: Settings,
+    *,
+    timeout: float | None = 3.0,
+    validator_url: Optional[str] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> GiftListResult:
+    """Blocking wrapper around :func:`fetch_room_gift_list_conditional_async`."""
+
+    coro = _fetch_conditional(
+        settings,
+        timeout=timeout,
+        validator_url=validator_url,
+        etag=etag,
+        last_modified=last_modified,
+    )
+    try:
+        return _submit(coro).result()
+    except Exception:
+        logger.exception("获取礼物清单失败")
+        return GiftListResult()
@@ -1,19 +1,29 @@
 from __future__ import annotations
 
-import json
+import functools
 import logging
 import os
-from typing import Dict
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable
 
 from config.settings import Settings
-from services.gift_list_service import fetch_room_gift_list
+from core import fastjson
+from services.gift_list_service import GiftListResult, fetch_room_gift_list_conditional
 
 logger = logging.getLogger(__name__)
 
 GIFT_PRICE_ENV_KEY = "GIFT_PRICE_CACHE"
 
+# 礼物价格变化很少，磁盘缓存 24 小时内直接使用，过期后用 ETag/Last-Modified 条件请求刷新。
+DISK_CACHE_DIR = Path.home() / ".cache" / "gift-watch"
+DISK_CACHE_TTL_SEC = 24 * 3600
 
-def _normalize_price(value) -> int:
+
+@functools.lru_cache(maxsize=1024)
+def _parse_price(value) -> int:
     try:
         price_int = int(float(value))
         return max(price_int, 0)
@@ -21,8 +31,19 @@ def _normalize_price(value) -> int:
         return 0
 
 
-def _build_cache_from_list(settings: Settings) -> tuple[Dict[int, int], Dict[str, int]]:
-    gifts = fetch_room_gift_list(settings)
+def _normalize_price(value) -> int:
+    # 接口大多直接给整数，跳过 float 往返；其余取值高度重复，交给 lru_cache。
+    if isinstance(value, int):
+        return max(value, 0)
+    try:
+        return _parse_price(value)
+    except TypeError:  # 不可哈希的值
+        return _parse_price(str(value))
+
+
+def _build_cache_from_gifts(
+    gifts: Iterable[Dict[str, Any]],
+) -> tuple[Dict[int, int], Dict[str, int]]:
     by_id: Dict[int, int] = {}
     by_name: Dict[str, int] = {}
     for item in gifts:
@@ -39,41 +60,138 @@ def _build_cache_from_list(settings: Settings) -> tuple[Dict[int, int], Dict[str
             except Exception:
                 pass
         if gift_name:
-            by_name[gift_name] = unit_price
+            by_name[sys.intern(gift_name)] = unit_price
 
     return by_id, by_name
 
 
+def _decode_cache(payload: Any) -> tuple[Dict[int, int], Dict[str, int]] | None:
+    if not isinstance(payload, dict):
+        return None
+    return (
+        {int(k): int(v) for k, v in (payload.get("by_id") or {}).items()},
+        {str(k): int(v) for k, v in (payload.get("by_name") or {}).items()},
+    )
+
+
+def _disk_paths(room_id: int) -> tuple[Path, Path]:
+    return (
+        DISK_CACHE_DIR / f"price_cache.{room_id}.json",
+        DISK_CACHE_DIR / f"price_cache.{room_id}.meta.json",
+    )
+
+
+def _read_json(path: Path) -> Any:
+    try:
+        return fastjson.loads(path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.debug("读取礼物价格磁盘缓存失败：%s", path, exc_info=True)
+        return None
+
+
+def _write_json_atomic(path: Path, payload: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=path.name, suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(fastjson.dumps(payload))
+        os.replace(tmp_name, path)
+    except Exception:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+def _save_disk_cache(
+    room_id: int,
+    cache: tuple[Dict[int, int], Dict[str, int]] | None,
+    result: GiftListResult,
+) -> None:
+    data_path, meta_path = _disk_paths(room_id)
+    try:
+        if cache is not None:
+            _write_json_atomic(data_path, {"by_id": cache[0], "by_name": cache[1]})
+        _write_json_atomic(
+            meta_path,
+            {
+                "url": result.url,
+                "etag": result.etag,
+                "last_modified": result.last_modified,
+                "saved_at": time.time(),
+            },
+        )
+    except Exception:
+        logger.debug("写入礼物价格磁盘缓存失败", exc_info=True)
+
+
+def _export_env(cache: tuple[Dict[int, int], Dict[str, int]]) -> None:
+    try:
+        os.environ[GIFT_PRICE_ENV_KEY] = fastjson.dumps({"by_id": cache[0], "by_name": cache[1]})
+    except Exception:
+        logger.debug("写入礼物价格缓存环境变量失败", exc_info=True)
+
+
 def ensure_gift_price_cache(settings: Settings) -> tuple[Dict[int, int], Dict[str, int]]:
     """Ensure gift price cache exists in the environment.
 
-    Fetches the gift list once on startup to avoid repeated network calls during
-    profit calculation. Prices are kept in raw金瓜子，换算人民币时用 1000:1。
+    Loads the per-room disk cache first, then the environment, and only then
+    hits the network (conditionally, when stale validators are on disk).
+    Prices are kept in raw金瓜子，换算人民币时用 1000:1。
     """
 
+    data_path, meta_path = _disk_paths(settings.room_id)
+    meta = _read_json(meta_path)
+    meta = meta if isinstance(meta, dict) else {}
+    disk_cache = None
+    try:
+        disk_cache = _decode_cache(_read_json(data_path))
+    except Exception:
+        logger.debug("解析礼物价格磁盘缓存失败，将重新拉取", exc_info=True)
+
+    saved_at = meta.get("saved_at")
+    fresh = isinstance(saved_at, (int, float)) and time.time() - saved_at < DISK_CACHE_TTL_SEC
+    if disk_cache and fresh:
+        _export_env(disk_cache)
+        return disk_cache
+
     raw_cache = os.getenv(GIFT_PRICE_ENV_KEY, "")
     if raw_cache:
         try:
-            payload = json.loads(raw_cache)
-            if isinstance(payload, dict):
-                return (
-                    {int(k): int(v) for k, v in (payload.get("by_id") or {}).items()},
-                    {str(k): int(v) for k, v in (payload.get("by_name") or {}).items()},
-                )
+            env_cache = _decode_cache(fastjson.loads(raw_cache))
+            if env_cache is not None:
+                return env_cache
         except Exception:
             logger.debug("解析已有的礼物价格缓存失败，将重新拉取", exc_info=True)
 
-    price_by_id, price_by_name = _build_cache_from_list(settings)
+    validators: Dict[str, Any] = {}
+    if disk_cache:
+        validators = {
+            "validator_url": meta.get("url"),
+            "etag": meta.get("etag"),
+            "last_modified": meta.get("last_modified"),
+        }
+    result = fetch_room_gift_list_conditional(settings, **validators)
+
+    if result.not_modified and disk_cache:
+        logger.info("礼物清单未变化(HTTP 304)，继续使用磁盘缓存")
+        _save_disk_cache(settings.room_id, None, result)
+        _export_env(disk_cache)
+        return disk_cache
+
+    price_by_id, price_by_name = _build_cache_from_gifts(result.gifts)
     if not price_by_id and not price_by_name:
+        if disk_cache:
+            logger.warning("礼物列表为空，沿用过期的磁盘价格缓存")
+            _export_env(disk_cache)
+            return disk_cache
         logger.warning("礼物列表为空，无法缓存礼物价格")
         return price_by_id, price_by_name
 
-    try:
-        os.environ[GIFT_PRICE_ENV_KEY] = json.dumps(
-            {"by_id": price_by_id, "by_name": price_by_name}, ensure_ascii=False
-        )
-    except Exception:
-        logger.debug("写入礼物价格缓存环境变量失败", exc_info=True)
-
-    return price_by_id, price_by_name
-
+    cache = (price_by_id, price_by_name)
+    _save_disk_cache(settings.room_id, cache, result)
+    _export_env(cache)
+    return cache
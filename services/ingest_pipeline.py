@@ -1,13 +1,17 @@
 from __future__ import annotations
 
-from typing import Any, Awaitable, Callable, DefaultDict, Dict, Optional
+from typing import Any, Awaitable, Callable, Dict, Optional
 import logging
 import asyncio
 import time
 import json
 import re
-from collections import defaultdict
+import string
+import sys
+from array import array
+from collections import OrderedDict
 from dataclasses import dataclass, field
+from functools import lru_cache
 
 from config.settings import Settings, SettingsReloader
 from core.gift_parser import (
@@ -20,19 +24,39 @@ from core.gift_parser import (
     parse_share_event,
     probe_share_event,
 )
-from db.repo import insert_gift, query_blind_box_totals
+from db.repo import insert_gifts_bulk, query_blind_box_totals_bulk
 from db.repo import insert_danmaku_event
-from core.rule_engine import DailyGiftCounter, GiftRule, build_rule
+from core.day_key import DayKeyCache
+from core.rule_engine import GiftRule, build_rule
 from core.rate_limiter import RateLimiter
 from core.danmaku_sender import DanmakuSender
 from core.bili_client import get_bot_credential
 
 
-@dataclass
+@dataclass(slots=True)
 class PendingThanks:
     uname: str
-    gifts: DefaultDict[str, int] = field(default_factory=lambda: defaultdict(int))
-    task: Optional[asyncio.Task] = None
+    # 并行数组：gift_ids[i] 为礼物名编号，counts[i] 为累计数量，按首次出现顺序排列。
+    gift_ids: array = field(default_factory=lambda: array("i"))
+    counts: array = field(default_factory=lambda: array("i"))
+
+
+@dataclass(slots=True)
+class UserState:
+    """Per-user counters kept in one record so each event does a single dict lookup."""
+
+    day: int
+    daily_count: int = 0
+    threshold_hits: int = 0
+    day_thanks: int = 0
+    blind_box_ns: Optional[int] = None  # time.monotonic_ns() of the last blind-box reply
+    pending: Optional[PendingThanks] = None
+
+    def reset_day(self, day: int) -> None:
+        self.day = day
+        self.daily_count = 0
+        self.threshold_hits = 0
+        self.day_thanks = 0
 
 
 def json_dumps_safe(payload: Any) -> str:
@@ -41,9 +65,65 @@ def json_dumps_safe(payload: Any) -> str:
     except Exception:
         return "{}"
 
+def _first_dict(items: Any) -> dict[str, Any] | None:
+    for item in items:
+        if isinstance(item, dict):
+            return item
+    return None
+
+
+# 按 type() 精确分派 data 的常见形态，命中时省去逐个 isinstance 判断。
+_DATA_COERCERS: Dict[type, Callable[[Any], dict[str, Any] | None]] = {
+    dict: lambda raw: raw,
+    list: _first_dict,
+    tuple: _first_dict,
+    type(None): lambda raw: None,
+}
+
+
+def _coerce_text(raw: Any) -> str:
+    if type(raw) is str:
+        return raw.strip()
+    if not raw:
+        return ""
+    try:
+        return str(raw).strip()
+    except Exception:
+        return ""
+
+
+# 未知舰队等级按舰长称呼；导入时取一次，避免每次大航海事件都多查一次字典。
+_GUARD_DEFAULT = GUARD_LEVEL_NAMES[3]
+
+_TEMPLATE_CONVERTERS: Dict[str, Callable[[Any], str]] = {"s": str, "r": repr, "a": ascii}
+
+
+@lru_cache(maxsize=32)
+def _compile_template(template: str) -> Optional[tuple[tuple[str, Optional[str], Optional[str], Optional[str]], ...]]:
+    """Pre-split a format template; None means it needs the full ``str.format`` path."""
+
+    try:
+        tokens = tuple(string.Formatter().parse(template))
+    except ValueError:
+        return None
+    for _literal, field_name, spec, _conversion in tokens:
+        if field_name is None:
+            continue
+        # 只处理 {name}/{name!r}/{name:spec} 这类简单字段；属性、下标、嵌套格式交回 str.format。
+        if not field_name.isidentifier() or "{" in (spec or ""):
+            return None
+    return tokens
+
+
 class IngestPipeline:
     THANK_DELAY_SECONDS = 5
+    GIFT_WRITE_BATCH_SIZE = 256
+    GIFT_WRITE_QUEUE_MAX = 10_000
+    GIFT_WRITE_FLUSH_SECONDS = 0.5
+    BLIND_BOX_BATCH_SECONDS = 0.1
+    BLIND_BOX_COOLDOWN_NS = 5_000_000_000
     SHARE_DEDUP_CACHE_SECONDS = 3
+    USER_SHARDS = 16  # 必须是 2 的幂，_user_shard 用位与取分片
     _BLIND_BOX_PROFIT_PATTERN = re.compile(r"盈亏\s*¥?\s*([+-]?\d+(?:\.\d+)?)")
 
     def __init__(
@@ -60,12 +140,42 @@ class IngestPipeline:
         self.sender = sender
         self.settings_reloader = settings_reloader
         self.logger = logging.getLogger(__name__)
-        self._pending_thanks: Dict[Any, PendingThanks] = {}
+        # handle_event 每个事件都要判断调试日志，缓存结果；配置重载时再刷新。
+        self._debug = self.logger.isEnabledFor(logging.DEBUG)
+        # 用户 key -> UserState；按天的计数通过 _day_epoch 懒重置，跨天时顺带清理闲置用户。
+        # 按 hash(key) 分成若干小 dict：大量新用户涌入时扩容分摊到各分片，单次停顿更短。
+        self._users: tuple[Dict[Any, UserState], ...] = self._new_user_shards()
+        self._day_epoch: int = 0
+        # 礼物名是有限集合，用小整数编号累计待感谢数量；以价格缓存中的礼物名预先编号。
+        # 解析器已驻留礼物名，这里同样驻留预置名，使索引查找走 is 比较的快路径。
+        self._gift_names: list[str] = [sys.intern(name) for name in settings.gift_price_by_name]
+        self._gift_name_to_idx: Dict[str, int] = {
+            name: idx for idx, name in enumerate(self._gift_names)
+        }
+        # key -> 截止时间(loop.time())；延迟固定，插入顺序即截止顺序。
+        # 只为队首挂一个 TimerHandle，到期后处理所有到期项并为新的队首重新挂载。
+        self._flush_queue: OrderedDict[Any, float] = OrderedDict()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._send_tasks: set[asyncio.Task] = set()  # 持有引用，避免发送任务被提前回收
+        # 礼物入库先进队列，由写入协程按批（最多 256 条 / 0.5 秒）合并成一个事务。
+        # 队列有上限：数据库持续跟不上时让事件处理等待，而不是无限堆积内存。
+        # 队列中的 None 是「立即落库」信号：盲盒查询读库前用它催写入协程提前提交当前批次。
+        self._gift_write_queue: asyncio.Queue[Optional[GiftEvent]] = asyncio.Queue(
+            maxsize=self.GIFT_WRITE_QUEUE_MAX
+        )
+        self._writer_task: Optional[asyncio.Task] = None
+        # 已入队 / 已提交（含写入失败）的礼物条数；队列先进先出，比较两者即可知某一刻之前入队的礼物是否都已落库。
+        self._gift_enqueued_seq: int = 0
+        self._gift_written_seq: int = 0
+        self._gift_written_event = asyncio.Event()
         self._thanks_day: str | None = None
-        self._threshold_hits: Dict[Any, int] = {}
-        self._daily_counter = DailyGiftCounter()
-        self._user_day_thanks: Dict[Any, int] = {}
-        self._blind_box_cooldown: Dict[Any, float] = {}
+        self._day_keys = DayKeyCache()
+        # 盲盒触发词编译成一个正则，每条弹幕只做一次 C 层扫描；配置重载时重建。
+        self._trigger_pattern = self._compile_triggers(settings.blind_box_triggers)
+        self._blind_box_base = settings.blind_box_base_gift.strip()
+        # (uid, uname) -> 等待结果的 future；攒 100ms 后用一次聚合查询统一返回。
+        self._blind_box_pending: Dict[tuple, asyncio.Future] = {}
+        self._blind_box_flusher: Optional[asyncio.Task] = None
         self._share_exact_fingerprints: Dict[str, float] = {}
         self._danmaku_listeners: list[Callable[[dict[str, Any]], Awaitable[None]]] = []
 
@@ -131,25 +241,33 @@ class IngestPipeline:
             return
 
         latest = self.settings_reloader.reload_if_changed()
+        # 文件未变化时 reloader 返回同一个对象，身份比较即可，避免逐字段比较 dataclass。
+        if latest is self.settings:
+            return
         if latest == self.settings:
+            self.settings = latest
             return
 
         self.logger.info("检测到配置更新，重新加载感谢规则和限流")
         self.settings = latest
+        self._debug = self.logger.isEnabledFor(logging.DEBUG)
         self.rule = build_rule(
             self.settings.target_gifts, self.settings.target_gift_ids, self.settings.target_min_num
         )
         self.limiter = RateLimiter(
             global_cooldown_sec=self.settings.thank_global_cooldown_sec,
             per_user_cooldown_sec=self.settings.thank_per_user_cooldown_sec,
+            burst=self.settings.thank_burst,
             per_user_daily_limit=self.settings.thank_per_user_daily_limit,
         )
-        self._pending_thanks = {}
-        self._threshold_hits = {}
-        self._daily_counter = DailyGiftCounter()
-        self._user_day_thanks = {}
+        self._users = self._new_user_shards()
+        self._flush_queue = OrderedDict()
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
         self._thanks_day = None
-        self._blind_box_cooldown = {}
+        self._trigger_pattern = self._compile_triggers(self.settings.blind_box_triggers)
+        self._blind_box_base = self.settings.blind_box_base_gift.strip()
         self._share_exact_fingerprints = {}
         self._refresh_sender()
 
@@ -157,102 +275,134 @@ class IngestPipeline:
         self._refresh_settings()
         coerced_event = self._coerce_event_object(event)
         if coerced_event is None:
-            if self.logger.isEnabledFor(logging.DEBUG):
+            if self._debug:
                 self.logger.debug(
                     "忽略无法解析的事件类型 type=%s", type(event).__name__
                 )
             return
         event = coerced_event
-        # AsyncEvent 会在触发任意事件时再派发一次 __ALL__，形式为
-        # {"name": "<cmd>", "data": (<event>,)}，这里兼容这种结构。
-        if isinstance(event, dict) and "name" in event and "data" in event:
-            data = event.get("data")
-            if isinstance(data, (list, tuple)) and data and isinstance(data[0], dict):
-                inner_event = dict(data[0])
-            elif isinstance(data, (list, tuple)) and data:
-                inner_event = self._coerce_event_object(data[0])
-            elif isinstance(data, dict):
-                inner_event = dict(data)
-            else:
-                inner_event = None
+        cmd_hint: str | None = None
+        if "cmd" not in event and "name" in event:
+            event, cmd_hint = self._unwrap_all_envelope(event)
 
-            if inner_event is not None:
-                if "cmd" not in inner_event and event.get("name"):
-                    inner_event["cmd"] = event["name"]
-                event = inner_event
+        event, cmd, data = self._normalize(event, cmd_hint)
+        handler = _CMD_HANDLERS.get(cmd, IngestPipeline._handle_other_event)
+        await handler(self, event, cmd, data)
+
+    def _normalize(
+        self, event: dict[str, Any], cmd_hint: str | None = None
+    ) -> tuple[dict[str, Any], str, dict[str, Any] | None]:
+        """Resolve the command and coerce ``data`` once; handlers reuse the result."""
 
         raw_cmd = event.get("cmd") or event.get("command") or event.get("type")
-        cmd = normalize_cmd(raw_cmd)
         if raw_cmd and "cmd" not in event:
             event["cmd"] = raw_cmd
-
-        coerced_data = self._coerce_event_data(event)
-        if coerced_data is not None and coerced_data is not event.get("data"):
+        cmd = normalize_cmd(raw_cmd or cmd_hint)
+
+        raw_data = event.get("data")
+        coerced_data = self._coerce_event_data(raw_data)
+        if (
+            coerced_data is not None
+            and coerced_data is not raw_data
+            and not isinstance(raw_data, (list, tuple))
+        ):
+            # 对象形态的 data 无法直接序列化进 raw_json，只有这条少见路径才拷贝事件；
+            # 列表形态直接把取出的 dict 交给下游，不再整份复制事件。
             event = dict(event)
             event["data"] = coerced_data
-            # 可能在 data 中携带更准确的命令
-            if not cmd:
-                cmd = normalize_cmd(event.get("cmd") or event.get("command") or event.get("type"))
-
-        if self._is_danmaku_event(event, cmd):
-            parsed = self._parse_danmaku_event(event)
-            if parsed is not None:
-                uid, uname, content = parsed
-                if content:
-                    try:
-                        event_ts = self._extract_event_ts(event)
-                        insert_danmaku_event(
-                            self.settings,
-                            ts=event_ts,
-                            uid=uid,
-                            uname=uname or "",
-                            content=content,
-                            raw_json=json_dumps_safe(event),
-                        )
-                    except Exception:
-                        self.logger.exception("写入弹幕事件失败")
-            for listener in self._danmaku_listeners:
+        return event, cmd, coerced_data
+
+    def _unwrap_all_envelope(self, event: dict[str, Any]) -> tuple[dict[str, Any], str | None]:
+        # AsyncEvent 会在触发任意事件时再派发一次 __ALL__，形式为
+        # {"name": "<cmd>", "data": (<event>,)}，这里兼容这种结构。
+        data = event.get("data")
+        if isinstance(data, (list, tuple)) and data:
+            inner_event = self._coerce_event_object(data[0])
+        elif isinstance(data, dict):
+            inner_event = data
+        else:
+            inner_event = None
+
+        if inner_event is None:
+            return event, None
+        # 内层事件会被同一次 __ALL__ 以外的监听复用，不改写它，cmd 以提示的形式带出。
+        return inner_event, event.get("name") or None
+
+    async def _handle_other_event(
+        self, event: dict[str, Any], cmd: str, data: dict[str, Any] | None
+    ) -> None:
+        # 未登记的 cmd：可能是没有 cmd 的弹幕封装，也可能是携带礼物字段的未知事件。
+        if self._is_danmaku_event(event, cmd, data):
+            await self._handle_danmaku(event, cmd, data)
+            return
+        await self._handle_gift_event(event, cmd, data)
+
+    async def _handle_danmaku(
+        self, event: dict[str, Any], cmd: str, data: dict[str, Any] | None
+    ) -> None:
+        parsed = self._parse_danmaku_event(event, data)
+        if parsed is not None:
+            uid, uname, content = parsed
+            if content:
                 try:
-                    await listener(event)
+                    event_ts = self._extract_event_ts(event, data)
+                    insert_danmaku_event(
+                        self.settings,
+                        ts=event_ts,
+                        uid=uid,
+                        uname=uname or "",
+                        content=content,
+                        raw_json=json_dumps_safe(event),
+                    )
                 except Exception:
-                    self.logger.exception("弹幕监听回调执行失败 listener=%s", getattr(listener, "__name__", type(listener).__name__))
-            await self._handle_blind_box_query(event)
+                    self.logger.exception("写入弹幕事件失败")
+        for listener in self._danmaku_listeners:
+            try:
+                await listener(event)
+            except Exception:
+                self.logger.exception("弹幕监听回调执行失败 listener=%s", getattr(listener, "__name__", type(listener).__name__))
+        await self._handle_blind_box_query(event, data)
+
+    async def _handle_share(
+        self, event: dict[str, Any], cmd: str, data: dict[str, Any] | None
+    ) -> None:
+        share_gift = parse_share_event(event, room_id=self.settings.room_id, cmd=cmd, data=data)
+        if share_gift is None:
+            if self._debug:
+                probe = probe_share_event(event, cmd=cmd, data=data)
+                self.logger.debug(
+                    "收到 INTERACT_WORD 但非分享事件 probe=%s keys=%s",
+                    probe,
+                    list(event.keys()),
+                )
             return
-
-        if cmd == "INTERACT_WORD":
-            share_gift = parse_share_event(event, room_id=self.settings.room_id)
-            if share_gift is None:
-                if self.logger.isEnabledFor(logging.DEBUG):
-                    probe = probe_share_event(event)
-                    self.logger.debug(
-                        "收到 INTERACT_WORD 但非分享事件 probe=%s keys=%s",
-                        probe,
-                        list(event.keys()),
-                    )
-                return
-            if self._is_duplicate_share(share_gift):
-                if self.logger.isEnabledFor(logging.DEBUG):
-                    self.logger.debug(
-                        "跳过重复分享事件 uid=%s uname=%s ts=%s",
-                        share_gift.uid,
-                        share_gift.uname,
-                        share_gift.ts,
-                    )
-                return
-            insert_gift(self.settings, share_gift)
-            self.logger.info("🔁 收到分享：uid=%s uname=%s", share_gift.uid, share_gift.uname)
+        if self._is_duplicate_share(share_gift):
+            if self._debug:
+                self.logger.debug(
+                    "跳过重复分享事件 uid=%s uname=%s ts=%s",
+                    share_gift.uid,
+                    share_gift.uname,
+                    share_gift.ts,
+                )
             return
-
-        gift_like = self._is_gift_like_event(event)
+        await self._enqueue_gift(share_gift)
+        self.logger.info("🔁 收到分享：uid=%s uname=%s", share_gift.uid, share_gift.uname)
+
+    async def _handle_gift_event(
+        self, event: dict[str, Any], cmd: str, data: dict[str, Any] | None
+    ) -> None:
+        # _refresh_settings 只在 handle_event 开头替换配置，本次调用内读一次即可。
+        settings = self.settings
+        debug = self._debug
+        gift_like = self._is_gift_like_data(data)
         if cmd and cmd not in SUPPORTED_GIFT_CMDS and not gift_like:
-            if self.logger.isEnabledFor(logging.DEBUG):
+            if debug:
                 self.logger.debug("忽略非礼物事件 cmd=%s keys=%s", cmd, list(event.keys()))
             return
 
         if cmd in SUPPORTED_GIFT_CMDS and not gift_like:
-            data = event.get("data")
             if not isinstance(data, dict):
-                if self.logger.isEnabledFor(logging.DEBUG):
+                if debug:
                     self.logger.debug(
                         "忽略缺少礼物字段的事件 cmd=%s data_type=%s keys=%s",
                         cmd,
@@ -261,14 +411,19 @@ class IngestPipeline:
                     )
                 return
 
-        if cmd and self.logger.isEnabledFor(logging.DEBUG):
+        if debug and cmd:
             self.logger.debug("收到事件 cmd=%s keys=%s", cmd, list(event.keys()))
+        is_guard = cmd == "GUARD_BUY"
         gift: Optional[GiftEvent]
-        if cmd == "GUARD_BUY":
-            gift = parse_guard_buy(event, room_id=self.settings.room_id)
+        if is_guard:
+            gift = parse_guard_buy(event, room_id=settings.room_id, cmd=cmd, data=data)
         else:
             gift = parse_send_gift(
-                event, room_id=self.settings.room_id, allow_unknown_cmd=gift_like
+                event,
+                room_id=settings.room_id,
+                allow_unknown_cmd=gift_like,
+                cmd=cmd,
+                data=data,
             )
         if gift is None:
             if cmd == "SEND_GIFT":
@@ -279,15 +434,16 @@ class IngestPipeline:
 
         # GUARD_BUY 的 gift_id 是等级(1/2/3)，与普通礼物 id 可能冲突。
         # 若套用普通礼物价格缓存会把舰长/提督/总督金额错误覆盖。
-        if cmd != "GUARD_BUY":
+        if not is_guard:
             self._apply_gift_price(gift)
 
-        blind_box_base = self.settings.blind_box_base_gift.strip()
-        if blind_box_base and gift.gift_name.strip() == blind_box_base:
+        # 解析器产出的礼物名已 strip，基础礼物名在配置加载时 strip 一次。
+        blind_box_base = self._blind_box_base
+        if blind_box_base and gift.gift_name == blind_box_base:
             self.logger.debug("跳过盲盒基础礼物入库 gift=%s", gift.gift_name)
             return
 
-        insert_gift(self.settings, gift)
+        await self._enqueue_gift(gift)
 
         self.logger.info(
             "📦 收到礼物：uid=%s uname=%s gift=%s x%d price=%s",
@@ -298,47 +454,125 @@ class IngestPipeline:
             gift.total_price,
         )
 
-        if self.sender is None:
+        sender = self.sender
+        if sender is None:
             return
 
-        if cmd == "GUARD_BUY" and self.settings.thank_guard:
-            guard_name = GUARD_LEVEL_NAMES.get(gift.gift_id, GUARD_LEVEL_NAMES[3])
-            await self.sender.send_guard_thanks(gift.uname, guard_name)
+        if is_guard and settings.thank_guard:
+            guard_name = GUARD_LEVEL_NAMES.get(gift.gift_id, _GUARD_DEFAULT)
+            await sender.send_guard_thanks(gift.uname, guard_name)
 
-        key = self._user_key(gift)
-        day_key = self._ensure_thanks_day(gift.ts)
-
-        if self.settings.thank_mode == "value":
+        # 先做目标礼物/金额判断，不会感谢的礼物不去碰按天计数的状态。
+        if settings.thank_mode == "value":
             if not self._should_thank_by_value(gift):
                 return
-            if not self._allow_thanks(key, gift.ts, ignore_cooldown=cmd == "COMBO_SEND"):
+            key = self._user_key(gift)
+            self._ensure_thanks_day(gift.ts)
+            state = self._user_state(key)
+            # 已有待发送的汇总时直接并入，不再占用令牌；连击因此无需特判。
+            if state.pending is None and not self._allow_thanks(key, state, gift.ts):
                 return
-            self._buffer_thanks(gift)
+            self._buffer_thanks(gift, key, state)
             return
 
         if not self._is_target_gift(gift):
             return
 
-        day, total = self._daily_counter.add(key, gift.num or 1, gift.ts)
-        if day != day_key:
-            self._ensure_thanks_day(gift.ts)
+        key = self._user_key(gift)
+        self._ensure_thanks_day(gift.ts)
+        state = self._user_state(key)
+        state.daily_count += max(gift.num or 1, 0)
 
         threshold = max(self.rule.min_num, 1)
-        reached = total // threshold
-        sent = self._threshold_hits.get(key, 0)
-        if reached <= sent:
+        reached = state.daily_count // threshold
+        if reached <= state.threshold_hits:
             return
 
-        if not self._allow_thanks(key, gift.ts, ignore_cooldown=cmd == "COMBO_SEND"):
+        if state.pending is None and not self._allow_thanks(key, state, gift.ts):
             return
 
-        self._threshold_hits[key] = reached
-        self._buffer_thanks(gift)
+        state.threshold_hits = reached
+        self._buffer_thanks(gift, key, state)
+
+    async def _enqueue_gift(self, gift: GiftEvent) -> None:
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._gift_writer_loop())
+        await self._gift_write_queue.put(gift)
+        self._gift_enqueued_seq += 1
 
-    def _parse_danmaku_event(self, event: dict[str, Any]) -> tuple[int | None, str, str] | None:
-        data = event
-        if isinstance(event.get("data"), dict):
-            data = event.get("data") or {}
+    async def _wait_gifts_written(self) -> None:
+        """Wait until every gift enqueued so far has been committed."""
+
+        target = self._gift_enqueued_seq
+        if self._gift_written_seq >= target:
+            return
+        if self._writer_task is None or self._writer_task.done():
+            return
+        # 写入协程可能还在攒批（最长 GIFT_WRITE_FLUSH_SECONDS），发信号让它立即提交。
+        await self._gift_write_queue.put(None)
+        while self._gift_written_seq < target:
+            await self._gift_written_event.wait()
+
+    def _mark_gifts_written(self, count: int) -> None:
+        self._gift_written_seq += count
+        # 每批换一个新 Event：唤醒当前所有等待者，由它们自行比较序号决定是否继续等。
+        event, self._gift_written_event = self._gift_written_event, asyncio.Event()
+        event.set()
+
+    async def _gift_writer_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._gift_write_queue
+        batch: list[GiftEvent] = []
+        try:
+            while True:
+                first = await queue.get()
+                if first is None:
+                    continue  # 没有待写礼物，立即落库信号无事可做
+                batch.append(first)
+                deadline = loop.time() + self.GIFT_WRITE_FLUSH_SECONDS
+                while len(batch) < self.GIFT_WRITE_BATCH_SIZE:
+                    if not queue.empty():
+                        # 已在队列中的直接取走，只有队列空了才挂起等待。
+                        item = queue.get_nowait()
+                    else:
+                        remaining = deadline - loop.time()
+                        if remaining <= 0:
+                            break
+                        try:
+                            item = await asyncio.wait_for(queue.get(), timeout=remaining)
+                        except asyncio.TimeoutError:
+                            break
+                    if item is None:
+                        break  # 有人在等读库，提前提交当前批次
+                    batch.append(item)
+                # 先清空 batch：写入线程在协程被取消后仍会跑完，避免退出时重复写入。
+                pending, batch = batch, []
+                try:
+                    await asyncio.to_thread(insert_gifts_bulk, self.settings, pending)
+                except Exception:
+                    self.logger.exception("批量写入礼物失败 count=%s", len(pending))
+                self._mark_gifts_written(len(pending))
+        except asyncio.CancelledError:
+            # 退出前把已取出和仍在队列中的礼物同步写完，避免丢数据。
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item is not None:
+                    batch.append(item)
+            if batch:
+                try:
+                    insert_gifts_bulk(self.settings, batch)
+                except Exception:
+                    self.logger.exception("退出前写入礼物失败 count=%s", len(batch))
+            self._mark_gifts_written(len(batch))
+            raise
+
+    def _parse_danmaku_event(
+        self, event: dict[str, Any], data: Any = None
+    ) -> tuple[int | None, str, str] | None:
+        if data is None:
+            data = event.get("data")
+        if not isinstance(data, dict) or not data:
+            data = event
 
         info = data.get("info") or event.get("info")
         if isinstance(info, dict):  # 某些封装会把 info 放到 data.data 下
@@ -346,10 +580,8 @@ class IngestPipeline:
         if not isinstance(info, (list, tuple)) or len(info) < 3:
             return None
 
-        try:
-            content = str(info[1] or "").strip()
-        except Exception:
-            content = ""
+        # 弹幕是量最大的事件：常见的 str/int 字段直接走类型判断，其余形态才进异常兜底。
+        content = _coerce_text(info[1])
         if not content:
             return None
 
@@ -357,23 +589,25 @@ class IngestPipeline:
         uname = ""
         user_info = info[2] if len(info) > 2 else None
         if isinstance(user_info, (list, tuple)) and len(user_info) >= 2:
-            try:
-                uid_val = int(user_info[0] or 0)
-                uid = uid_val if uid_val > 0 else None
-            except Exception:
-                uid = None
-            try:
-                uname = str(user_info[1] or "").strip()
-            except Exception:
-                uname = ""
+            raw_uid = user_info[0]
+            if type(raw_uid) is int:
+                uid_val = raw_uid
+            else:
+                try:
+                    uid_val = int(raw_uid or 0)
+                except Exception:
+                    uid_val = 0
+            uid = uid_val if uid_val > 0 else None
+            uname = _coerce_text(user_info[1])
 
         if not uname:
             uname = str(event.get("uname") or event.get("user") or "").strip()
 
         return uid, uname, content
 
-    def _extract_event_ts(self, event: dict[str, Any]) -> int:
-        data = event.get("data")
+    def _extract_event_ts(self, event: dict[str, Any], data: Any = None) -> int:
+        if data is None:
+            data = event.get("data")
         candidates: list[Any] = [event, data]
         if isinstance(data, dict):
             candidates.append(data.get("data"))
@@ -395,15 +629,14 @@ class IngestPipeline:
                     return val
         return int(time.time())
 
-    def _coerce_event_data(self, event: dict[str, Any]) -> dict[str, Any] | None:
-        raw = event.get("data")
+    def _coerce_event_data(self, raw: Any) -> dict[str, Any] | None:
+        coercer = _DATA_COERCERS.get(type(raw))
+        if coercer is not None:
+            return coercer(raw)
         if isinstance(raw, dict):
             return raw
-
         if isinstance(raw, (list, tuple)):
-            for item in raw:
-                if isinstance(item, dict):
-                    return item
+            return _first_dict(raw)
 
         if hasattr(raw, "__dict__"):
             coerced = dict(vars(raw))
@@ -412,11 +645,14 @@ class IngestPipeline:
                 coerced.setdefault("data", inner)
             return coerced
 
-    def _is_danmaku_event(self, event: dict[str, Any], cmd: str | None) -> bool:
+    def _is_danmaku_event(
+        self, event: dict[str, Any], cmd: str | None, data: Any = None
+    ) -> bool:
         if isinstance(cmd, str) and cmd.startswith("DANMU_MSG"):
             return True
 
-        data = event.get("data") if isinstance(event, dict) else None
+        if data is None and isinstance(event, dict):
+            data = event.get("data")
         info = None
         if isinstance(data, dict):
             info = data.get("info")
@@ -425,8 +661,7 @@ class IngestPipeline:
 
         return isinstance(info, (list, tuple)) and len(info) >= 2
 
-    def _is_gift_like_event(self, event: dict[str, Any]) -> bool:
-        data = event.get("data") or {}
+    def _is_gift_like_data(self, data: Any) -> bool:
         if isinstance(data, dict) and isinstance(data.get("data"), dict):
             data = data.get("data")  # bilibili-api 的部分封装会套一层 data.data
 
@@ -454,12 +689,18 @@ class IngestPipeline:
 
         return bool(gift_name or gift_id)
 
+    @staticmethod
+    def _compile_triggers(triggers: list[str]) -> Optional[re.Pattern[str]]:
+        cleaned = [t.strip() for t in triggers if t.strip()]
+        if not cleaned:
+            return None
+        # 纯中文等无大小写的触发词不加 IGNORECASE，正则引擎可以走逐字符直接比较。
+        has_case = any(t.lower() != t.upper() for t in cleaned)
+        return re.compile("|".join(map(re.escape, cleaned)), re.IGNORECASE if has_case else 0)
+
     def _is_blind_box_trigger(self, content: str) -> bool:
-        triggers = [t.strip().lower() for t in self.settings.blind_box_triggers if t.strip()]
-        if not triggers:
-            return False
-        content_lower = content.strip().lower()
-        return any(t and t in content_lower for t in triggers)
+        pattern = self._trigger_pattern
+        return pattern is not None and pattern.search(content) is not None
 
     def _is_duplicate_share(self, share: GiftEvent) -> bool:
         uid_part = share.uid if share.uid > 0 else 0
@@ -494,8 +735,20 @@ class IngestPipeline:
             return f"{coins / 1000:.2f}"
 
     def _render_template(self, template: str, **kwargs: object) -> str:
+        tokens = _compile_template(template)
         try:
-            return template.format(**kwargs)
+            if tokens is None:
+                return template.format(**kwargs)
+            parts: list[str] = []
+            for literal, field_name, spec, conversion in tokens:
+                parts.append(literal)
+                if field_name is None:
+                    continue
+                value = kwargs[field_name]
+                if conversion:
+                    value = _TEMPLATE_CONVERTERS[conversion](value)
+                parts.append(format(value, spec or ""))
+            return "".join(parts)
         except Exception:
             return template
 
@@ -523,7 +776,7 @@ class IngestPipeline:
         if normalized in bare_amounts:
             rewritten = replacement
 
-        if rewritten != message and self.logger.isEnabledFor(logging.DEBUG):
+        if rewritten != message and self._debug:
             self.logger.debug(
                 "盲盒弹幕文案已改写以提升可见性 before=%s after=%s",
                 message,
@@ -534,12 +787,13 @@ class IngestPipeline:
     def _default_blind_box_template(self) -> str:
         return "{uname} {base_gift}{profit_result}"
 
-    def _should_reply_blind_box(self, key: Any, ts: float) -> bool:
-        cooldown_sec = 5
-        last_ts = self._blind_box_cooldown.get(key)
-        if last_ts is not None and ts - last_ts < cooldown_sec:
+    def _should_reply_blind_box(self, key: Any, now_ns: int) -> bool:
+        # 冷却只做区间比较，用单调时钟的整数纳秒，不受系统校时影响。
+        state = self._user_state(key)
+        last_ns = state.blind_box_ns
+        if last_ns is not None and now_ns - last_ns < self.BLIND_BOX_COOLDOWN_NS:
             return False
-        self._blind_box_cooldown[key] = ts
+        state.blind_box_ns = now_ns
         return True
 
     def _apply_gift_price(self, gift: GiftEvent) -> None:
@@ -550,7 +804,7 @@ class IngestPipeline:
             unit_price = self.settings.gift_price_by_name[gift.gift_name]
 
         if unit_price is None:
-            if self.logger.isEnabledFor(logging.DEBUG):
+            if self._debug:
                 self.logger.debug(
                     "未找到礼物单价，沿用原始金额 gift_id=%s gift_name=%s raw_total=%s",
                     gift.gift_id,
@@ -566,7 +820,7 @@ class IngestPipeline:
 
         computed = unit_price * qty
         if gift.total_price != computed:
-            if self.logger.isEnabledFor(logging.DEBUG):
+            if self._debug:
                 self.logger.debug(
                     "应用礼物价格缓存 gift_id=%s gift_name=%s 单价=%s 数量=%s 覆盖总价 %s -> %s",
                     gift.gift_id,
@@ -578,25 +832,25 @@ class IngestPipeline:
                 )
             gift.total_price = computed
 
-    async def _handle_blind_box_query(self, event: dict[str, Any]) -> None:
+    async def _handle_blind_box_query(self, event: dict[str, Any], data: Any = None) -> None:
         if not self.settings.blind_box_enabled:
-            if self.logger.isEnabledFor(logging.DEBUG):
+            if self._debug:
                 self.logger.debug("盲盒查询已关闭，忽略弹幕事件")
             return
 
-        parsed = self._parse_danmaku_event(event)
+        parsed = self._parse_danmaku_event(event, data)
         if parsed is None:
-            if self.logger.isEnabledFor(logging.DEBUG):
+            if self._debug:
                 self.logger.debug("盲盒查询解析弹幕失败 event_keys=%s", list(event.keys()))
             return
         uid, uname, content = parsed
         if not uname and uid is None:
-            if self.logger.isEnabledFor(logging.DEBUG):
+            if self._debug:
                 self.logger.debug("盲盒查询缺少用户信息 content=%s", content)
             return
 
         if not self._is_blind_box_trigger(content):
-            if self.logger.isEnabledFor(logging.DEBUG):
+            if self._debug:
                 self.logger.debug(
                     "弹幕未命中盲盒触发词 content=%s triggers=%s",
                     content,
@@ -604,21 +858,14 @@ class IngestPipeline:
                 )
             return
 
-        ts = time.time()
         key = uid or f"guest:{uname}"
-        if not self._should_reply_blind_box(key, ts):
-            if self.logger.isEnabledFor(logging.DEBUG):
+        if not self._should_reply_blind_box(key, time.monotonic_ns()):
+            if self._debug:
                 self.logger.debug("盲盒查询冷却中 uid=%s uname=%s", uid, uname)
             return
 
         try:
-            base_total, reward_total = query_blind_box_totals(
-                self.settings,
-                uid=uid,
-                uname=uname or None,
-                base_gift=self.settings.blind_box_base_gift,
-                reward_gifts=self.settings.blind_box_rewards,
-            )
+            base_total, reward_total = await self._query_blind_box_totals(uid, uname or None)
         except Exception:
             self.logger.exception("盲盒查询失败：读取礼物记录时出错")
             return
@@ -667,28 +914,84 @@ class IngestPipeline:
                 await self.sender.send_custom_message(message)
             except Exception:
                 self.logger.exception("发送盲盒盈亏弹幕失败")
-        elif self.logger.isEnabledFor(logging.DEBUG):
+        elif self._debug:
             self.logger.debug(
                 "盲盒查询已计算但未发送弹幕 send_enabled=%s sender_present=%s",
                 self.settings.blind_box_send_danmaku,
                 bool(self.sender),
             )
 
+    def _query_blind_box_totals(self, uid: int | None, uname: str | None) -> asyncio.Future:
+        key = (uid, uname)
+        future = self._blind_box_pending.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._blind_box_pending[key] = future
+        if self._blind_box_flusher is None or self._blind_box_flusher.done():
+            self._blind_box_flusher = asyncio.create_task(self._flush_blind_box_queries())
+        return future
+
+    async def _flush_blind_box_queries(self) -> None:
+        # 查询期间新到的请求进入新的 pending，循环处理直到一个窗口内没有新请求。
+        while True:
+            await asyncio.sleep(self.BLIND_BOX_BATCH_SECONDS)
+            pending, self._blind_box_pending = self._blind_box_pending, {}
+            if not pending:
+                return
+            try:
+                # 刚开完盲盒就发触发词很常见：先等此前入队的礼物全部落库，盈亏才包含最新的几次。
+                await self._wait_gifts_written()
+                results = await asyncio.to_thread(
+                    query_blind_box_totals_bulk,
+                    self.settings,
+                    keys=list(pending),
+                    base_gift=self.settings.blind_box_base_gift,
+                    reward_gifts=self.settings.blind_box_rewards,
+                )
+            except Exception as exc:
+                for future in pending.values():
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            for key, future in pending.items():
+                if not future.done():
+                    future.set_result(results.get(key, (0, 0)))
+
     def _user_key(self, gift: GiftEvent) -> Any:
         return gift.uid or f"guest:{gift.uname}"
 
     def _ensure_thanks_day(self, ts: float) -> str:
-        day = time.strftime("%Y-%m-%d", time.localtime(ts))
+        # 同一天内 DayKeyCache 只做一次区间比较，跨过零点时才重新计算。
+        day = self._day_keys.day_key(ts)
         if self._thanks_day != day:
             self._thanks_day = day
-            self._threshold_hits = {}
-            self._user_day_thanks = {}
+            self._day_epoch += 1
+            # 仍有待发送感谢的用户保留，其余用户的按天状态已失效，直接丢弃。
+            self._users = tuple(
+                {k: st for k, st in shard.items() if st.pending is not None}
+                for shard in self._users
+            )
         return day
 
-    def _allow_thanks(self, key: Any, ts: float, *, ignore_cooldown: bool = False) -> bool:
-        daily_sent = self._user_day_thanks.get(key, 0)
+    def _new_user_shards(self) -> tuple[Dict[Any, UserState], ...]:
+        return tuple({} for _ in range(self.USER_SHARDS))
+
+    def _user_shard(self, key: Any) -> Dict[Any, UserState]:
+        return self._users[hash(key) & (self.USER_SHARDS - 1)]
+
+    def _user_state(self, key: Any) -> UserState:
+        shard = self._user_shard(key)
+        state = shard.get(key)
+        if state is None:
+            state = shard[key] = UserState(day=self._day_epoch)
+        elif state.day != self._day_epoch:
+            state.reset_day(self._day_epoch)
+        return state
+
+    def _allow_thanks(self, key: Any, state: UserState, ts: float) -> bool:
+        daily_sent = state.day_thanks
         if self.settings.thank_per_user_daily_limit > 0 and daily_sent >= self.settings.thank_per_user_daily_limit:
-            if self.logger.isEnabledFor(logging.DEBUG):
+            if self._debug:
                 self.logger.debug(
                     "感谢节流：已达单日上限 uid=%s sent=%s limit=%s",
                     key,
@@ -697,9 +1000,9 @@ class IngestPipeline:
                 )
             return False
 
-        decision = self.limiter.allow_with_reason(key, ts, ignore_cooldown=ignore_cooldown)
+        decision = self.limiter.allow_with_reason(key, ts)
         if not decision.allowed:
-            if self.logger.isEnabledFor(logging.DEBUG):
+            if self._debug:
                 retry_after = (
                     f"{decision.retry_after:.2f}s" if decision.retry_after is not None else "n/a"
                 )
@@ -712,7 +1015,7 @@ class IngestPipeline:
                 )
             return False
 
-        self._user_day_thanks[key] = daily_sent + 1
+        state.day_thanks = daily_sent + 1
         return True
 
     def _is_target_gift(self, gift: GiftEvent) -> bool:
@@ -727,27 +1030,87 @@ class IngestPipeline:
             return False
         return gift.total_price >= self.settings.thank_value_threshold
 
-    def _buffer_thanks(self, gift: GiftEvent) -> None:
+    def _buffer_thanks(self, gift: GiftEvent, key: Any, state: UserState) -> None:
         """将同一用户 5 秒内的礼物合并，再发送一条汇总感谢，避免刷屏。"""
 
         if self.sender is None:
             return
 
-        key = gift.uid or f"guest:{gift.uname}"
-        pending = self._pending_thanks.get(key)
+        pending = state.pending
         if pending is None:
-            pending = PendingThanks(uname=gift.uname)
-            self._pending_thanks[key] = pending
-            pending.task = asyncio.create_task(self._flush_thanks_after_delay(key))
+            pending = state.pending = PendingThanks(uname=gift.uname)
+            # 截止时间从首个礼物开始计算，后续礼物只合并、不顺延。
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.THANK_DELAY_SECONDS
+            self._flush_queue[key] = deadline
+            if self._flush_handle is None:
+                self._flush_handle = loop.call_at(deadline, self._flush_due)
 
         pending.uname = gift.uname  # 更新昵称，避免用户改名导致的旧称呼
-        pending.gifts[gift.gift_name] += gift.num or 1
-
-    async def _flush_thanks_after_delay(self, key: Any) -> None:
+        gift_idx = self._gift_index(gift.gift_name)
+        try:
+            pos = pending.gift_ids.index(gift_idx)
+        except ValueError:
+            pos = len(pending.gift_ids)
+            pending.gift_ids.append(gift_idx)
+            pending.counts.append(0)
+        pending.counts[pos] += gift.num or 1
+
+    def _gift_index(self, gift_name: str) -> int:
+        idx = self._gift_name_to_idx.get(gift_name)
+        if idx is None:
+            idx = len(self._gift_names)
+            self._gift_names.append(gift_name)
+            self._gift_name_to_idx[gift_name] = idx
+        return idx
+
+    def _flush_due(self) -> None:
+        self._flush_handle = None
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        due: list[PendingThanks] = []
+        while self._flush_queue:
+            key, deadline = next(iter(self._flush_queue.items()))
+            if deadline > now:
+                self._flush_handle = loop.call_at(deadline, self._flush_due)
+                break
+            del self._flush_queue[key]
+            state = self._user_shard(key).get(key)
+            pending = state.pending if state is not None else None
+            if state is not None:
+                state.pending = None
+            if pending and pending.gift_ids:
+                due.append(pending)
+
+        # 同一时刻到期的感谢合并到一个发送任务里依次发送，而不是每个用户一个任务。
+        if due and self.sender:
+            task = asyncio.create_task(self._send_pending_thanks(due))
+            self._send_tasks.add(task)
+            task.add_done_callback(self._send_tasks.discard)
+
+    async def _send_pending_thanks(self, batch: list[PendingThanks]) -> None:
+        for pending in batch:
+            await self._send_one_pending_thanks(pending)
+
+    async def _send_one_pending_thanks(self, pending: PendingThanks) -> None:
         try:
-            await asyncio.sleep(self.THANK_DELAY_SECONDS)
-            pending = self._pending_thanks.pop(key, None)
-            if pending and pending.gifts and self.sender:
-                await self.sender.send_summary_thanks(pending.uname, dict(pending.gifts))
+            if self.sender:
+                # 编号 -> 礼物名与 zip 组装均在 C 层完成，不逐项执行字节码。
+                gifts = dict(
+                    zip(map(self._gift_names.__getitem__, pending.gift_ids), pending.counts)
+                )
+                await self.sender.send_summary_thanks(pending.uname, gifts)
         except Exception:
             self.logger.exception("发送汇总感谢消息失败")
+
+
+# normalize_cmd 之后的命令 -> 处理函数；未登记的命令走 _handle_other_event。
+_CMD_HANDLERS: Dict[
+    str, Callable[[IngestPipeline, dict[str, Any], str, dict[str, Any] | None], Awaitable[None]]
+] = {
+    "DANMU_MSG": IngestPipeline._handle_danmaku,
+    "INTERACT_WORD": IngestPipeline._handle_share,
+    "SEND_GIFT": IngestPipeline._handle_gift_event,
+    "COMBO_SEND": IngestPipeline._handle_gift_event,
+    "GUARD_BUY": IngestPipeline._handle_gift_event,
+}
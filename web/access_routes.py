@@ -13,8 +13,9 @@ from web.auth import (
     resolve_password_session,
 )
 from web.pathing import with_base_path
+from web.responses import FastJSONResponse
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)
 
 STATIC_DIR = Path(__file__).resolve().parent / "static"
 
@@ -10,15 +10,24 @@ from db.sqlite import init_db
 from web.access_routes import router as access_router
 from web.auth import get_current_session
 from web.pathing import get_base_path, with_base_path
+from web.responses import FastJSONResponse
 from web.routes import router
 from web.manager_routes import router as manager_router
 from services.gift_price_cache import ensure_gift_price_cache
 
-app = FastAPI(title="gift-watch")
+# 所有路由默认用 orjson 渲染 JSON（未安装时退回标准库），页面和跳转仍按各自的响应类返回。
+app = FastAPI(title="gift-watch", default_response_class=FastJSONResponse)
 
 BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / "static"
 BASE_PATH = get_base_path()
+# 页面需要先校验会话，不能整目录挂 StaticFiles；路径与跳转地址在导入时算好即可。
+INDEX_FILE = STATIC_DIR / "index.html"
+MANAGER_FILE = STATIC_DIR / "manager.html"
+_HOME_URL = with_base_path("/")
+_ACCESS_URL = with_base_path("/access")
+_APP_URL = with_base_path("/app")
+_MANAGER_URL = with_base_path("/manager")
 
 @app.on_event("startup")
 def _startup():
@@ -31,9 +40,11 @@ app.include_router(manager_router, prefix=BASE_PATH)
 app.include_router(access_router, prefix=BASE_PATH)
 
 
-@app.get("/")
-def root_home():
-    return RedirectResponse(with_base_path("/"), status_code=302)
+if BASE_PATH:
+    # 未配置前缀时 "/" 就是 home，再注册跳转会与之重复并自我重定向。
+    @app.get("/")
+    def root_home():
+        return RedirectResponse(_HOME_URL, status_code=302)
 
 
 @app.get(BASE_PATH or "/")
@@ -41,21 +52,21 @@ def root_home():
 def home(request: Request):
     session = get_current_session(request)
     if not session:
-        return RedirectResponse(with_base_path("/access"), status_code=302)
-    return RedirectResponse(with_base_path("/manager" if session.role == "manager" else "/app"), status_code=302)
+        return RedirectResponse(_ACCESS_URL, status_code=302)
+    return RedirectResponse(_MANAGER_URL if session.role == "manager" else _APP_URL, status_code=302)
 
 
-@app.get(with_base_path("/app"))
+@app.get(_APP_URL)
 def app_page(request: Request):
     session = get_current_session(request)
     if not session:
-        return RedirectResponse(with_base_path("/access"), status_code=302)
-    return FileResponse(STATIC_DIR / "index.html")
+        return RedirectResponse(_ACCESS_URL, status_code=302)
+    return FileResponse(INDEX_FILE)
 
 
-@app.get(with_base_path("/manager"))
+@app.get(_MANAGER_URL)
 def manager_page(request: Request):
     session = get_current_session(request)
     if not session or session.role != "manager":
-        return RedirectResponse(with_base_path("/access"), status_code=302)
-    return FileResponse(STATIC_DIR / "manager.html")
+        return RedirectResponse(_ACCESS_URL, status_code=302)
+    return FileResponse(MANAGER_FILE)
@@ -15,9 +15,10 @@ from pydantic import BaseModel, Field
 from config.env_store import save_env
 from web.auth import require_manager_session
 from web.pathing import with_base_path
+from web.responses import FastJSONResponse
 from services.bot_identity_service import detect_bot_identity
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 RUN_DIR = PROJECT_ROOT / "run"
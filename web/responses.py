@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from core import fastjson
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available (stdlib json otherwise)."""
+
+    def render(self, content: Any) -> bytes:
+        return fastjson.dumps_bytes(content)
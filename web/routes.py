@@ -1,18 +1,27 @@
 from __future__ import annotations
 
-from collections import defaultdict
+import base64
+from bisect import bisect_right
+import heapq
+from itertools import repeat
+import os
+import threading
+import zlib
+import time as time_module
 from datetime import datetime, time, timedelta
-import json
+from typing import Literal
 
-from fastapi import APIRouter, Body, HTTPException, Query, Request
-from pydantic import BaseModel, Field, field_validator
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response
+from pydantic import BaseModel, Field
 from zoneinfo import ZoneInfo
 
 from config.env_store import save_env
 from config.settings import DEFAULT_ENV_FILE, Settings, get_settings, resolve_env_file
+from core import fastjson
 from db.repo import (
     delete_gift_by_id,
     query_gift_by_id,
+    query_gifts_version,
     query_gifts_by_uname,
     query_gifts_by_uname_and_gift,
     query_recent_gifts_paginated,
@@ -20,6 +29,7 @@ from db.repo import (
     query_flow_summary,
     query_user_events,
     query_danmaku_events,
+    iter_danmaku_events,
     query_gift_totals_by_user,
     query_share_leaderboard,
 )
@@ -27,19 +37,65 @@ from services.gift_list_service import fetch_room_gift_list
 from db.sqlite import init_db
 from services.bot_identity_service import detect_bot_identity
 from web.auth import resolve_allowed_env
+from web.responses import FastJSONResponse
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)
+_SETTINGS_CACHE_LOCK = threading.Lock()
+_SETTINGS_CACHE: dict[str | None, tuple[int | None, Settings]] = {}
+_INITIALIZED_DB_PATHS: set[str] = set()
+
+# 运营面板的聚合结果按参数缓存 60 秒：面板会轮询，聚合跨度可达 30 天。
+_OPS_CACHE_TTL_SEC = 60
+_OPS_CACHE_LOCK = threading.Lock()
+_OPS_CACHE: dict[tuple, tuple[float, bytes]] = {}
+
+# 房间礼物清单来自 B 站上游接口，按房间缓存 30 秒；每个房间一把锁，并发的首个请求只打一次上游。
+_ROOM_GIFT_LIST_TTL_SEC = 30
+_ROOM_GIFT_LIST_LOCKS_GUARD = threading.Lock()
+_ROOM_GIFT_LIST_LOCKS: dict[int, threading.Lock] = {}
+_ROOM_GIFT_LIST_CACHE: dict[int, tuple[float, bytes]] = {}
+
+# 运营面板统一按北京时间划分场次/时间桶，时区对象只构造一次。
+_TZ_SH = ZoneInfo("Asia/Shanghai")
+
+
+# 未指定 env 时的默认 .env 路径在导入时解析一次，省去每个请求的 .env 存在性检查。
+_DEFAULT_RESOLVED_ENV = resolve_env_file(DEFAULT_ENV_FILE)
 
 
 def _resolve_env(request: Request, env: str | None) -> str | None:
-    effective = (env or "").strip()
-    resolved = resolve_env_file(effective or DEFAULT_ENV_FILE)
+    effective = env.strip() if env else ""
+    resolved = resolve_env_file(effective) if effective else _DEFAULT_RESOLVED_ENV
     return resolve_allowed_env(request, resolved)
 
 
+def _env_mtime_ns(path: str | None) -> int | None:
+    if not path:
+        return None
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
 def _settings_for_request(request: Request, env: str | None) -> Settings:
-    settings = get_settings(_resolve_env(request, env))
-    init_db(settings)
+    # 同一 .env 未改动时复用解析结果；文件 mtime 变化（含保存配置）即重新加载。
+    resolved = _resolve_env(request, env)
+    mtime_ns = _env_mtime_ns(resolved)
+    with _SETTINGS_CACHE_LOCK:
+        cached = _SETTINGS_CACHE.get(resolved)
+    if cached is not None and cached[0] == mtime_ns:
+        settings = cached[1]
+    else:
+        settings = get_settings(resolved)
+        with _SETTINGS_CACHE_LOCK:
+            _SETTINGS_CACHE[resolved] = (mtime_ns, settings)
+
+    # 建表/迁移每个数据库文件只需执行一次，不必每个请求都跑。
+    if settings.db_path not in _INITIALIZED_DB_PATHS:
+        init_db(settings)
+        with _SETTINGS_CACHE_LOCK:
+            _INITIALIZED_DB_PATHS.add(settings.db_path)
     return settings
 
 
@@ -71,20 +127,9 @@ class SettingsPayload(BaseModel):
     blind_box_template: str = Field("", description="盲盒盈亏回复模板")
     blind_box_send_danmaku: bool = Field(True, description="是否发送盲盒盈亏弹幕")
 
-    @field_validator("thank_mode")
-    @classmethod
-    def validate_mode(cls, v: str) -> str:
-        v = (v or "").lower()
-        return v if v in {"count", "value"} else "count"
-
-    @field_validator("announce_mode")
-    @classmethod
-    def validate_announce_mode(cls, v: str) -> str:
-        v = (v or "").lower()
-        return v if v in {"interval", "message_count"} else "interval"
-
 
 def _serialize_settings(settings: Settings) -> dict:
+    # 出站方向只是把已校验的 Settings 平铺成 dict，不经 Pydantic 模型，也不再走 jsonable_encoder。
     return {
         "thank_guard": settings.thank_guard,
         "thank_mode": settings.thank_mode,
@@ -113,15 +158,30 @@ def _serialize_settings(settings: Settings) -> dict:
     }
 
 
+_THANK_MODES = frozenset({"count", "value"})
+_ANNOUNCE_MODES = frozenset({"interval", "message_count"})
+
+
+def _normalize_choice(value: str, allowed: frozenset[str], default: str) -> str:
+    # 前端提交的本就是合法小写值，命中时不再 lower() 复制一份字符串。
+    if value in allowed:
+        return value
+    value = value.lower() if value else ""
+    return value if value in allowed else default
+
+
 def _env_payload_from_settings(payload: SettingsPayload) -> dict[str, str]:
-    gifts = ",".join([g.strip() for g in payload.target_gifts if g.strip()])
-    gift_ids = ",".join([str(i) for i in payload.target_gift_ids if i])
+    # 模式字段只在写入 .env 时归一化一次，不走 Pydantic 的逐字段 validator 分派。
+    thank_mode = _normalize_choice(payload.thank_mode, _THANK_MODES, "count")
+    announce_mode = _normalize_choice(payload.announce_mode, _ANNOUNCE_MODES, "interval")
+    gifts = ",".join(filter(None, map(str.strip, payload.target_gifts)))
+    gift_ids = ",".join(map(str, filter(None, payload.target_gift_ids)))
     return {
         "TARGET_GIFTS": gifts,
         "TARGET_GIFT_IDS": gift_ids,
         "TARGET_MIN_NUM": str(max(payload.target_min_num, 1)),
         "THANK_PER_USER_DAILY_LIMIT": str(max(payload.thank_per_user_daily_limit, 0)),
-        "THANK_MODE": payload.thank_mode,
+        "THANK_MODE": thank_mode,
         "THANK_VALUE_THRESHOLD": str(max(payload.thank_value_threshold, 0)),
         "THANK_GUARD": "1" if payload.thank_guard else "0",
         "THANK_MESSAGE_SINGLE": payload.thank_templates.single,
@@ -131,7 +191,7 @@ def _env_payload_from_settings(payload: SettingsPayload) -> dict[str, str]:
         "ANNOUNCE_INTERVAL_SEC": str(max(payload.announce_interval_sec, 30)),
         "ANNOUNCE_MESSAGE": payload.announce_message,
         "ANNOUNCE_SKIP_OFFLINE": "1" if payload.announce_skip_offline else "0",
-        "ANNOUNCE_MODE": payload.announce_mode,
+        "ANNOUNCE_MODE": announce_mode,
         "ANNOUNCE_DANMAKU_THRESHOLD": str(max(payload.announce_danmaku_threshold, 1)),
         "BLIND_BOX_ENABLED": "1" if payload.blind_box_enabled else "0",
         "BLIND_BOX_TRIGGERS": ",".join(payload.blind_box_triggers),
@@ -142,11 +202,25 @@ def _env_payload_from_settings(payload: SettingsPayload) -> dict[str, str]:
     }
 
 
-def _default_start_ts(now: datetime) -> int:
+# 当前「今日 8 点」窗口 (start_ts, next_start_ts)；窗口内的请求直接复用，每天只做一次 datetime 换算。
+_DEFAULT_START_WINDOW: tuple[int, int] = (0, 0)
+
+
+def _default_start_ts(now_ts: int) -> int:
+    global _DEFAULT_START_WINDOW
+    start_ts, next_start_ts = _DEFAULT_START_WINDOW
+    if start_ts <= now_ts < next_start_ts:
+        return start_ts
+
+    now = datetime.fromtimestamp(now_ts)
     eight_am = datetime.combine(now.date(), time(8, 0))
     if eight_am > now:
         eight_am = eight_am - timedelta(days=1)
-    return int(eight_am.timestamp())
+    start_ts = int(eight_am.timestamp())
+    # 下一个边界同样按本地日期计算，跨夏令时也不会偏移。
+    next_start_ts = int(datetime.combine(eight_am.date() + timedelta(days=1), time(8, 0)).timestamp())
+    _DEFAULT_START_WINDOW = (start_ts, next_start_ts)
+    return start_ts
 
 
 def _align_session_start(dt: datetime, session_start_hour: int = 8) -> datetime:
@@ -156,26 +230,50 @@ def _align_session_start(dt: datetime, session_start_hour: int = 8) -> datetime:
     return anchor
 
 
-def _extract_message_length(raw_json: str) -> int:
-    try:
-        data = json.loads(raw_json)
-    except Exception:
-        return 0
+# 礼物/分享列表接口共用的列名，与 query_* 返回的列顺序一致。
+# 这些行只含 sqlite 的 int/str，接口直接返回 FastJSONResponse，让 FastAPI 跳过 jsonable_encoder 的逐层遍历。
+_GIFT_FIELDS = ("id", "ts", "uid", "uname", "gift_name", "num", "total_price")
+_SHARE_FIELDS = ("uid", "uname", "share_count", "first_share_ts", "last_share_ts")
+
+
+def _gift_rows(rows, layout: str = "rows") -> list[dict] | dict:
+    if layout == "columns":
+        # 列式输出：列名只写一次，行直接复用 sqlite 返回的元组，不再逐行构造字典。
+        return {"columns": _GIFT_FIELDS, "rows": rows}
+    return _zip_rows(_GIFT_FIELDS, rows)
+
+
+def _zip_rows(fields: tuple[str, ...], rows) -> list[dict]:
+    # map(dict, map(zip, repeat(fields), rows)) 整个循环都在 C 层完成，逐行不执行任何 Python 字节码。
+    return list(map(dict, map(zip, repeat(fields), rows)))
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
 
-    text = ""
-    if isinstance(data, dict):
-        for key in ("msg", "message", "content", "text"):
-            val = data.get(key)
-            if isinstance(val, str) and val.strip():
-                text = val.strip()
-                break
 
-        if not text:
-            info = data.get("info")
-            if isinstance(info, (list, tuple)) and len(info) > 1 and isinstance(info[1], str):
-                text = info[1].strip()
+def _gifts_etag(settings: Settings, kind: str, *parts: object) -> str:
+    # ETag 需带上数据来源（库文件 + 房间）：同一 URL 可能按会话绑定到不同 .env。
+    # 来源与附加参数（可能含中文）统一取 crc32，保证响应头只含 ASCII。
+    # 写入版本取自 app_meta 的单行计数器，必须在读数据之前取：期间若有写入，
+    # 下一次轮询会拿到新 ETag 重新下发，而不会把旧数据标成新版本。
+    scope_text = "\0".join(map(str, (settings.db_path, settings.room_id, *parts)))
+    scope = zlib.crc32(scope_text.encode("utf-8"))
+    version = query_gifts_version(settings)
+    return f'W/"{kind}-{settings.room_id}-{scope:08x}-{version}"'
 
-    return len(text)
+
+def _not_modified(request: Request, etag: str) -> Response | None:
+    # 前端轮询时数据多半没变：ETag 命中时在查询数据之前就回 304，查询与序列化都省掉。
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+_LAYOUT_QUERY = Query("rows", alias="format", description="rows=逐行对象；columns=列名 + 二维数组，体积更小")
 
 
 @router.get("/api/search")
@@ -186,40 +284,24 @@ def search(
     guard_level: int | None = Query(None, ge=1, le=3, description="大航海等级：1=总督 2=提督 3=舰长"),
     limit: int = Query(200, ge=1, le=1000),
     start_ts: int | None = Query(None, description="开始时间（Unix 秒）"),
+    layout: Literal["rows", "columns"] = _LAYOUT_QUERY,
     env: str | None = Query(None, description="可选 .env 文件路径，用于绑定前端/后端"),
 ):
     settings = _settings_for_request(request, env)
-    now = datetime.now()
-    effective_start_ts = start_ts if start_ts is not None else _default_start_ts(now)
-    end_ts = int(now.timestamp())
-
-    if gift_name:
-        rows = query_gifts_by_uname_and_gift(
-            settings,
-            uname=uname,
-            gift_name=gift_name,
-            limit=limit,
-            start_ts=effective_start_ts,
-            end_ts=end_ts,
-            guard_level=guard_level,
-        )
-    else:
-        rows = query_gifts_by_uname(
-            settings, uname=uname, limit=limit, start_ts=effective_start_ts, end_ts=end_ts, guard_level=guard_level
-        )
+    end_ts = int(time_module.time())
+    effective_start_ts = start_ts if start_ts is not None else _default_start_ts(end_ts)
 
-    return [
-        {
-            "id": r[0],
-            "ts": r[1],
-            "uid": r[2],
-            "uname": r[3],
-            "gift_name": r[4],
-            "num": r[5],
-            "total_price": r[6],
-        }
-        for r in rows
-    ]
+    rows = query_gifts_by_uname(
+        settings,
+        uname=uname,
+        limit=limit,
+        start_ts=effective_start_ts,
+        end_ts=end_ts,
+        guard_level=guard_level,
+        gift_name=gift_name,
+    )
+
+    return FastJSONResponse(_gift_rows(rows, layout))
 
 
 
@@ -240,16 +322,7 @@ def list_shares(
         limit=limit,
     )
 
-    return [
-        {
-            "uid": r[0],
-            "uname": r[1],
-            "share_count": r[2],
-            "first_share_ts": r[3],
-            "last_share_ts": r[4],
-        }
-        for r in rows
-    ]
+    return FastJSONResponse(_zip_rows(_SHARE_FIELDS, rows))
 
 
 @router.get("/api/gifts")
@@ -261,9 +334,14 @@ def list_gifts(
     uname: str | None = Query(None, description="用户名"),
     gift_name: str | None = Query(None, description="礼物名"),
     guard_level: int | None = Query(None, ge=1, le=3, description="大航海等级：1=总督 2=提督 3=舰长"),
+    layout: Literal["rows", "columns"] = _LAYOUT_QUERY,
     env: str | None = Query(None, description="可选 .env 文件路径，用于绑定前端/后端"),
 ):
     settings = _settings_for_request(request, env)
+    etag = _gifts_etag(settings, "gifts", layout)
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
     rows = query_recent_gifts(
         settings,
         limit=limit,
@@ -274,18 +352,19 @@ def list_gifts(
         guard_level=guard_level,
     )
 
-    return [
-        {
-            "id": r[0],
-            "ts": r[1],
-            "uid": r[2],
-            "uname": r[3],
-            "gift_name": r[4],
-            "num": r[5],
-            "total_price": r[6],
-        }
-        for r in rows
-    ]
+    return FastJSONResponse(_gift_rows(rows, layout), headers={"ETag": etag})
+
+
+def _encode_gift_cursor(row) -> str:
+    return base64.urlsafe_b64encode(f"{row[1]}:{row[0]}".encode("ascii")).decode("ascii")
+
+
+def _decode_gift_cursor(cursor: str) -> tuple[int, int]:
+    try:
+        ts_raw, id_raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split(":", 1)
+        return int(ts_raw), int(id_raw)
+    except Exception:
+        raise HTTPException(status_code=400, detail="cursor 无效") from None
 
 
 @router.get("/api/gifts/paged")
@@ -293,15 +372,18 @@ def list_gifts_paginated(
     request: Request,
     page: int = Query(1, ge=1, description="页码，从 1 开始"),
     page_size: int = Query(50, ge=1, le=500, description="每页条数"),
+    cursor: str | None = Query(None, description="上一页返回的 next_cursor；传入后按游标翻页，忽略 page"),
     start_ts: int | None = Query(None, description="开始时间（Unix 秒）"),
     end_ts: int | None = Query(None, description="结束时间（Unix 秒）"),
     uname: str | None = Query(None, description="用户名"),
     gift_name: str | None = Query(None, description="礼物名"),
     guard_level: int | None = Query(None, ge=1, le=3, description="大航海等级：1=总督 2=提督 3=舰长"),
+    layout: Literal["rows", "columns"] = _LAYOUT_QUERY,
     env: str | None = Query(None, description="可选 .env 文件路径，用于绑定前端/后端"),
 ):
     settings = _settings_for_request(request, env)
-    total, rows = query_recent_gifts_paginated(
+    after = _decode_gift_cursor(cursor) if cursor else None
+    total, rows, has_more = query_recent_gifts_paginated(
         settings,
         page=page,
         page_size=page_size,
@@ -310,25 +392,18 @@ def list_gifts_paginated(
         uname=uname,
         gift_name=gift_name,
         guard_level=guard_level,
+        after=after,
     )
 
-    return {
+    payload = {
         "page": page,
         "page_size": page_size,
         "total": total,
-        "items": [
-            {
-                "id": r[0],
-                "ts": r[1],
-                "uid": r[2],
-                "uname": r[3],
-                "gift_name": r[4],
-                "num": r[5],
-                "total_price": r[6],
-            }
-            for r in rows
-        ],
+        "items": _gift_rows(rows, layout),
+        "has_more": has_more,
+        "next_cursor": _encode_gift_cursor(rows[-1]) if has_more and rows else None,
     }
+    return FastJSONResponse(payload)
 
 
 @router.get("/api/gifts/{gift_id}")
@@ -342,15 +417,7 @@ def get_gift(
     if not row:
         raise HTTPException(status_code=404, detail="记录不存在")
 
-    return {
-        "id": row[0],
-        "ts": row[1],
-        "uid": row[2],
-        "uname": row[3],
-        "gift_name": row[4],
-        "num": row[5],
-        "total_price": row[6],
-    }
+    return FastJSONResponse(dict(zip(_GIFT_FIELDS, row)))
 
 
 @router.delete("/api/gifts/{gift_id}")
@@ -363,7 +430,36 @@ def delete_gift(
     deleted = delete_gift_by_id(settings, gift_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="记录不存在或已删除")
-    return {"deleted": True, "id": gift_id}
+    return FastJSONResponse({"deleted": True, "id": gift_id})
+
+
+def _json_bytes_response(body: bytes) -> Response:
+    return Response(body, media_type="application/json")
+
+
+def _ops_cache_get(key: tuple) -> Response | None:
+    now = time_module.monotonic()
+    with _OPS_CACHE_LOCK:
+        cached = _OPS_CACHE.get(key)
+    if cached and now - cached[0] <= _OPS_CACHE_TTL_SEC:
+        return _json_bytes_response(cached[1])
+    return None
+
+
+def _ops_cache_put(key: tuple, result: dict) -> Response:
+    # 缓存序列化后的字节：命中时既不走 jsonable_encoder，也不再重复序列化同一份聚合结果。
+    body = fastjson.dumps_bytes(result)
+    now = time_module.monotonic()
+    with _OPS_CACHE_LOCK:
+        if len(_OPS_CACHE) >= 256:
+            for stale_key in [k for k, (ts, _) in _OPS_CACHE.items() if now - ts > _OPS_CACHE_TTL_SEC]:
+                del _OPS_CACHE[stale_key]
+        _OPS_CACHE[key] = (now, body)
+    return _json_bytes_response(body)
+
+
+def _engagement_rank(row: dict) -> tuple:
+    return row["message_count"], row["session_count"], row["last_ts"] or 0
 
 
 @router.get("/api/ops/engagement")
@@ -372,10 +468,15 @@ def engagement_panel(
     session_count: int = Query(6, ge=1, le=30, description="需要统计的场次数"),
     lookback: int = Query(3, ge=1, le=30, description="老观众需要连续出现的场次"),
     end_ts: int | None = Query(None, description="最近一场的结束时间（Unix 秒），默认当前时间"),
+    top_k: int | None = Query(None, ge=1, le=10000, description="只返回发言最多的前 K 位用户，默认全部"),
     env: str | None = Query(None, description="可选 .env 文件路径"),
 ):
     settings = _settings_for_request(request, env)
-    tz = ZoneInfo("Asia/Shanghai")
+    cache_key = ("engagement", settings.db_path, settings.room_id, session_count, lookback, end_ts, top_k)
+    cached = _ops_cache_get(cache_key)
+    if cached is not None:
+        return cached
+    tz = _TZ_SH
     now = datetime.now(tz)
     anchor_end = datetime.fromtimestamp(end_ts, tz) if end_ts else now
 
@@ -393,42 +494,59 @@ def engagement_panel(
 
     session_users: list[set[str]] = []
     seen_users: set[str] = set()
-    user_stats: dict[str, dict] = defaultdict(
-        lambda: {
-            "uid": None,
-            "uname": "",
-            "sessions": set(),
-            "message_count": 0,
-            "total_price": 0,
-            "total_length": 0,
-            "sent_gift": False,
-            "first_ts": None,
-            "last_ts": None,
-        }
-    )
+    user_stats: dict[str, dict] = {}
 
     session_rows: list[dict] = []
 
-    for idx, (start_dt, end_dt) in enumerate(ranges):
-        rows = query_danmaku_events(settings, int(start_dt.timestamp()), int(end_dt.timestamp()))
-        users_this_session: set[str] = set()
-        gift_totals = query_gift_totals_by_user(settings, int(start_dt.timestamp()), int(end_dt.timestamp()))
-
-        for uid, uname, content, ts in rows:
-            key = str(uid) if uid is not None else (uname or "")
-            if not key:
-                continue
-
-            profile = user_stats[key]
+    # 各场次首尾相接：一次查询取回整个窗口，再按场次起点二分归桶，省去逐场查询；
+    # 每个边界只做一次 timestamp() 换算，下文循环直接复用整数区间。
+    bounds = [int(start_dt.timestamp()) for start_dt, _end_dt in ranges]
+    window_end_ts = int(ranges[-1][1].timestamp())
+    ranges_ts = list(zip(bounds, bounds[1:] + [window_end_ts]))
+    users_by_session: list[set[str]] = [set() for _ in ranges]
+    for uid, uname, content, ts in iter_danmaku_events(settings, bounds[0], window_end_ts):
+        key = str(uid) if uid is not None else (uname or "")
+        if not key:
+            continue
+        idx = bisect_right(bounds, ts) - 1
+
+        # content 列本就是 TEXT，绝大多数行直接取长度，无需再 str() 一次；
+        # 空值（None/""）直接记 0，不走任何转换。
+        if not content:
+            length = 0
+        elif type(content) is str:
+            length = len(content)
+        else:
+            length = len(str(content))
+        profile = user_stats.get(key)
+        if profile is None:
+            # 首次出现直接用本行数据建档，不经 defaultdict 工厂函数。
+            user_stats[key] = {
+                "uid": uid,
+                "uname": uname,
+                "sessions": 1 << idx,  # 位掩码：第 idx 场出现过则第 idx 位为 1
+                "message_count": 1,
+                "total_price": 0,
+                "total_length": length,
+                "sent_gift": False,
+                "first_ts": ts,
+                "last_ts": ts,
+            }
+        else:
             profile["uid"] = uid
             profile["uname"] = uname
-            profile["sessions"].add(idx)
+            profile["sessions"] |= 1 << idx
             profile["message_count"] += 1
-            profile["total_length"] += len(str(content or ""))
+            profile["total_length"] += length
             profile["first_ts"] = ts if profile["first_ts"] is None else min(profile["first_ts"], ts)
             profile["last_ts"] = ts if profile["last_ts"] is None else max(profile["last_ts"], ts)
 
-            users_this_session.add(key)
+        users_by_session[idx].add(key)
+
+    for idx, (start_dt, end_dt) in enumerate(ranges):
+        range_start_ts, range_end_ts = ranges_ts[idx]
+        users_this_session = users_by_session[idx]
+        gift_totals = query_gift_totals_by_user(settings, range_start_ts, range_end_ts)
 
         for key in users_this_session:
             price = int(gift_totals.get(key, 0) or 0)
@@ -438,24 +556,26 @@ def engagement_panel(
 
         session_users.append(users_this_session)
         prior_sets = session_users[-effective_lookback - 1 : -1]
-        returning = set(users_this_session)
-        if len(prior_sets) >= effective_lookback:
-            for s in prior_sets[-effective_lookback:]:
-                returning &= s
-        else:
-            returning = set()
+        # 只需要人数：回访数取 C 层一次求交后的长度，新用户数取 seen_users 并入前后的增量，
+        # 不再为 new_users 单独构造差集。
+        returning_count = (
+            len(users_this_session.intersection(*prior_sets[-effective_lookback:]))
+            if len(prior_sets) >= effective_lookback
+            else 0
+        )
 
-        new_users = users_this_session - seen_users
+        seen_before = len(seen_users)
         seen_users |= users_this_session
+        new_count = len(seen_users) - seen_before
 
         session_rows.append(
             {
-                "label": start_dt.strftime("%m/%d %H:%M") + " - " + end_dt.strftime("%m/%d %H:%M"),
-                "start_ts": int(start_dt.timestamp()),
-                "end_ts": int(end_dt.timestamp()),
+                "label": f"{start_dt:%m/%d %H:%M} - {end_dt:%m/%d %H:%M}",
+                "start_ts": range_start_ts,
+                "end_ts": range_end_ts,
                 "active_count": len(users_this_session),
-                "returning_count": len(returning),
-                "new_count": len(new_users),
+                "returning_count": returning_count,
+                "new_count": new_count,
             }
         )
 
@@ -469,7 +589,7 @@ def engagement_panel(
             {
                 "uid": data["uid"],
                 "uname": data["uname"] or key,
-                "session_count": len(data["sessions"]),
+                "session_count": data["sessions"].bit_count(),
                 "message_count": msg_count,
                 "avg_length": round(total_len / msg_count, 1) if msg_count else 0,
                 "total_price": data["total_price"],
@@ -479,17 +599,24 @@ def engagement_panel(
             }
         )
 
-    users_out.sort(key=lambda r: (-r["message_count"], -r["session_count"], -(r["last_ts"] or 0)))
+    if top_k is not None and top_k < len(users_out):
+        # 只要前 K 名时用堆选，O(N log K)；结果与完整排序后截断一致。
+        users_out = heapq.nlargest(top_k, users_out, key=_engagement_rank)
+    else:
+        users_out.sort(key=_engagement_rank, reverse=True)
     session_rows.reverse()
 
-    return {
-        "lookback": effective_lookback,
-        "session_count": session_count,
-        "session_hours": 24,
-        "anchor_end_ts": int(aligned_end.timestamp()),
-        "sessions": session_rows,
-        "users": users_out,
-    }
+    return _ops_cache_put(
+        cache_key,
+        {
+            "lookback": effective_lookback,
+            "session_count": session_count,
+            "session_hours": 24,
+            "anchor_end_ts": window_end_ts,
+            "sessions": session_rows,
+            "users": users_out,
+        },
+    )
 
 
 def _normalize_time_range(range_key: str, tz: ZoneInfo) -> tuple[datetime, datetime, int, bool]:
@@ -523,44 +650,52 @@ def ops_timeline(
     env: str | None = Query(None, description="可选 .env 文件路径"),
 ):
     settings = _settings_for_request(request, env)
-    tz = ZoneInfo("Asia/Shanghai")
+    cache_key = ("timeline", settings.db_path, settings.room_id, range_key, end_ts)
+    cached = _ops_cache_get(cache_key)
+    if cached is not None:
+        return cached
+    tz = _TZ_SH
     start_dt, default_end, bucket_seconds, cumulative = _normalize_time_range(range_key, tz)
 
     if end_ts:
         default_end = datetime.fromtimestamp(end_ts, tz)
 
-    rows = query_danmaku_events(settings, int(start_dt.timestamp()), int(default_end.timestamp()))
     start_ts = int(start_dt.timestamp())
     end_ts_val = int(default_end.timestamp())
+    rows = query_danmaku_events(settings, start_ts, end_ts_val)
 
-    if range_key == "today":
-        ts_values = [int(ts) for *_rest, ts in rows if ts is not None]
-        if ts_values:
-            earliest = min(ts_values)
-            latest = max(ts_values)
-            start_ts = max(start_ts, (earliest // bucket_seconds) * bucket_seconds)
-            end_ts_val = min(
-                end_ts_val,
-                max(start_ts + bucket_seconds, ((latest // bucket_seconds) + 1) * bucket_seconds),
-            )
+    # 只遍历一次行数据：顺带记录最早/最晚时间，并把 (key, ts) 暂存下来供分桶使用。
+    keyed: list[tuple[str, int]] = []
+    earliest: int | None = None
+    latest: int | None = None
+    for uid, uname, _content, ts in rows:
+        if ts is None:
+            continue
+        ts = int(ts)
+        if earliest is None or ts < earliest:
+            earliest = ts
+        if latest is None or ts > latest:
+            latest = ts
+        key = str(uid) if uid is not None else (uname or "")  # 与 engagement_panel 的用户 key 一致
+        if key:
+            keyed.append((key, ts))
+
+    if range_key == "today" and earliest is not None and latest is not None:
+        start_ts = max(start_ts, (earliest // bucket_seconds) * bucket_seconds)
+        end_ts_val = min(
+            end_ts_val,
+            max(start_ts + bucket_seconds, ((latest // bucket_seconds) + 1) * bucket_seconds),
+        )
 
     total_buckets = max(1, int((end_ts_val - start_ts) / bucket_seconds) + 1)
 
     bucket_users: list[set[str]] = [set() for _ in range(total_buckets)]
 
-    def uid_key(uid, uname):
-        return str(uid) if uid is not None else (uname or "")
-
-    for uid, uname, _content, ts in rows:
-        if ts is None:
-            continue
-        key = uid_key(uid, uname)
-        if not key:
-            continue
+    # 先判时间范围：范围内 start_ts <= ts < end_ts_val，桶号天然落在 [0, total_buckets) 内。
+    for key, ts in keyed:
         if ts < start_ts or ts >= end_ts_val:
             continue
-        idx = min(total_buckets - 1, max(0, int((ts - start_ts) // bucket_seconds)))
-        bucket_users[idx].add(key)
+        bucket_users[(ts - start_ts) // bucket_seconds].add(key)
 
     seen: set[str] = set()
     points: list[dict] = []
@@ -576,15 +711,39 @@ def ops_timeline(
     metric = "DANMAKU_ACTIVE_USERS" if not cumulative else "DANMAKU_CUMULATIVE_USERS"
     metric_label = "发言活跃用户数" if not cumulative else "累计发言用户数"
 
-    return {
-        "range": range_key,
-        "start_ts": start_ts,
-        "end_ts": end_ts_val,
-        "bucket_seconds": bucket_seconds,
-        "metric": metric,
-        "metric_label": metric_label,
-        "points": points,
-    }
+    return _ops_cache_put(
+        cache_key,
+        {
+            "range": range_key,
+            "start_ts": start_ts,
+            "end_ts": end_ts_val,
+            "bucket_seconds": bucket_seconds,
+            "metric": metric,
+            "metric_label": metric_label,
+            "points": points,
+        },
+    )
+
+
+def _room_gift_list_body(settings: Settings) -> bytes:
+    room_id = settings.room_id
+    cached = _ROOM_GIFT_LIST_CACHE.get(room_id)
+    if cached and time_module.monotonic() - cached[0] <= _ROOM_GIFT_LIST_TTL_SEC:
+        return cached[1]
+
+    with _ROOM_GIFT_LIST_LOCKS_GUARD:
+        lock = _ROOM_GIFT_LIST_LOCKS.setdefault(room_id, threading.Lock())
+    with lock:
+        # 排队期间可能已有其他请求刷新过缓存，再查一次。
+        cached = _ROOM_GIFT_LIST_CACHE.get(room_id)
+        if cached and time_module.monotonic() - cached[0] <= _ROOM_GIFT_LIST_TTL_SEC:
+            return cached[1]
+        gifts = fetch_room_gift_list(settings)
+        # 缓存的是序列化后的字节，命中时连 orjson 都不用跑。
+        body = fastjson.dumps_bytes(gifts)
+        if gifts:  # 上游失败时返回空列表，不缓存，下次请求继续重试
+            _ROOM_GIFT_LIST_CACHE[room_id] = (time_module.monotonic(), body)
+        return body
 
 
 @router.get("/api/room_gift_list")
@@ -593,7 +752,7 @@ def room_gift_list(
     env: str | None = Query(None, description="可选 .env 文件路径，用于绑定前端/后端"),
 ):
     settings = _settings_for_request(request, env)
-    return fetch_room_gift_list(settings)
+    return _json_bytes_response(_room_gift_list_body(settings))
 
 
 @router.get("/api/summary")
@@ -604,19 +763,25 @@ def summary(
     env: str | None = Query(None, description="可选 .env 文件路径，用于绑定前端/后端"),
 ):
     settings = _settings_for_request(request, env)
-    return query_flow_summary(settings, start_ts=start_ts, end_ts=end_ts)
+    # 汇总不计入盲盒基础礼物，该配置改动时需换 ETag。
+    etag = _gifts_etag(settings, "summary", settings.blind_box_base_gift.strip())
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    result = query_flow_summary(settings, start_ts=start_ts, end_ts=end_ts)
+    return FastJSONResponse(result, headers={"ETag": etag})
 
 
 @router.get("/api/settings")
 def read_settings(request: Request, env: str | None = Query(None, description="可选 .env 文件路径")):
     settings = _settings_for_request(request, env)
-    return _serialize_settings(settings)
+    return FastJSONResponse(_serialize_settings(settings))
 
 
 @router.get("/api/bot_identity")
 def read_bot_identity(request: Request, env: str | None = Query(None, description="可选 .env 文件路径")):
     resolved_env = _resolve_env(request, env)
-    return detect_bot_identity(resolved_env)
+    return FastJSONResponse(detect_bot_identity(resolved_env))
 
 
 @router.post("/api/settings")
@@ -629,7 +794,10 @@ def update_settings(
     resolved_env = _resolve_env(request, env)
     save_env(env_payload, resolved_env)
     settings = get_settings(resolved_env)
-    return _serialize_settings(settings)
+    # 保存后直接刷新缓存：mtime 精度较粗的文件系统上，同一时刻内的改动可能看不出 mtime 变化。
+    with _SETTINGS_CACHE_LOCK:
+        _SETTINGS_CACHE[resolved_env] = (_env_mtime_ns(resolved_env), settings)
+    return FastJSONResponse(_serialize_settings(settings))
 
 
 @router.get("/api/check")
@@ -642,18 +810,6 @@ def check(
     settings = _settings_for_request(request, env)
     rows = query_gifts_by_uname_and_gift(settings, uname=uname, gift_name=gift_name, limit=1)
     if not rows:
-        return {"found": False, "latest": None}
+        return FastJSONResponse({"found": False, "latest": None})
 
-    r = rows[0]
-    return {
-        "found": True,
-        "latest": {
-            "id": r[0],
-            "ts": r[1],
-            "uid": r[2],
-            "uname": r[3],
-            "gift_name": r[4],
-            "num": r[5],
-            "total_price": r[6],
-        },
-    }
+    return FastJSONResponse({"found": True, "latest": dict(zip(_GIFT_FIELDS, rows[0]))})
@@ -15,10 +15,42 @@ def _server_port() -> int:
     return int(value) if value else 3333
 
 
+def _worker_count() -> int | None:
+    # 热重载模式下 uvicorn 只能单进程运行；否则默认每个 CPU 一个 worker。
+    if _reload_enabled():
+        return None
+    value = os.getenv("UVICORN_WORKERS", "").strip()
+    return max(int(value), 1) if value else (os.cpu_count() or 1)
+
+
+def _prepare_once() -> None:
+    """Run one-off startup work in the parent before forking workers.
+
+    Each worker's startup hook still calls init_db/ensure_gift_price_cache, but
+    by then migrations are done (init_db is also file-locked) and the price
+    cache is inherited through the environment, so those calls are cheap re-checks.
+    """
+
+    from config.settings import get_settings, resolve_env_file
+    from db.sqlite import init_db
+    from services.gift_price_cache import ensure_gift_price_cache
+
+    settings = get_settings(resolve_env_file(None))
+    ensure_gift_price_cache(settings)
+    init_db(settings)
+
+
 if __name__ == "__main__":
+    workers = _worker_count()
+    if workers and workers > 1:
+        _prepare_once()
     uvicorn.run(
         "web.app:app",
         host="0.0.0.0",
         port=_server_port(),
+        # auto 会在已安装 uvloop/httptools 时优先使用它们（Windows 下没有 uvloop，自动退回 asyncio）。
+        loop="auto",
+        http="auto",
+        workers=workers,
         reload=_reload_enabled(),
     )